@@ -0,0 +1,107 @@
+import re
+from typing import List, Optional
+
+# Commands the game server understands, by their first word
+ACTION_PREFIXES = ("cut", "press", "hold", "release", "help", "state")
+
+# A complete command line in generated text, usable as a stop sequence
+COMMAND_LINE = re.compile(r"^[ \t]*(?:%s)\b[^\n]*\n" % "|".join(ACTION_PREFIXES), re.IGNORECASE | re.MULTILINE)
+
+# Played when no legal command can be told from a reply: it wastes the turn but cannot explode the bomb
+FALLBACK_ACTION = "help"
+
+
+def parse_legal_actions(state_text: str) -> List[str]:
+    """
+    Extract the commands listed under 'Available commands:' in a bomb state.
+
+    :param state_text: Bomb state text from the server.
+    :return: The legal commands, in the order the server listed them.
+    """
+    actions: List[str] = []
+    in_list = False
+    for line in state_text.splitlines():
+        if line.strip() == "Available commands:":
+            in_list = True
+            actions = []
+        elif in_list and line.startswith("  ") and line.strip():
+            actions.append(line.strip())
+        else:
+            in_list = False
+    return actions
+
+
+def parse_action(text: str, default: Optional[str] = FALLBACK_ACTION) -> Optional[str]:
+    """
+    Find the first line of a model response that is a game command.
+
+    :param text: The generated text.
+    :param default: Returned when no line starts with a known command.
+    :return: The command, lower-cased and stripped.
+    """
+    for line in text.splitlines():
+        line = line.strip().lower()
+        if line.startswith(ACTION_PREFIXES):
+            return line
+    return default
+
+
+class IncrementalActionParser:
+    """
+    Finds the first game command in text that arrives in pieces, e.g. streamed tokens.
+
+    A line counts once it is complete (terminated by a newline). With a list of legal
+    actions, only those are accepted, and a pending line that spells a legal action
+    which no other legal action extends is accepted right away.
+    """
+
+    def __init__(self, legal_actions: Optional[List[str]] = None) -> None:
+        """
+        :param legal_actions: The commands to accept, None to accept any known command.
+        """
+        self.legal_actions = [a.strip().lower() for a in legal_actions] if legal_actions else None
+        self.text = ""
+        self.action: Optional[str] = None
+
+    def feed(self, delta: str) -> Optional[str]:
+        """
+        Add a piece of text.
+
+        :param delta: The newly arrived text.
+        :return: The command once one has been found, otherwise None.
+        """
+        if self.action is not None:
+            return self.action
+        self.text += delta
+
+        *complete, pending = self.text.split("\n")
+        for line in complete:
+            self.action = self._accept(line)
+            if self.action is not None:
+                return self.action
+
+        pending = pending.strip().lower()
+        if self.legal_actions and pending in self.legal_actions and not any(
+                a != pending and a.startswith(pending) for a in self.legal_actions):
+            self.action = pending
+        return self.action
+
+    def finish(self, default: Optional[str] = FALLBACK_ACTION) -> Optional[str]:
+        """
+        Treat the text received so far as complete.
+
+        :param default: Returned when the text contains no command.
+        :return: The command found, or 'default'.
+        """
+        if self.action is None:
+            for line in self.text.split("\n"):
+                self.action = self._accept(line)
+                if self.action is not None:
+                    break
+        return self.action if self.action is not None else default
+
+    def _accept(self, line: str) -> Optional[str]:
+        line = line.strip().lower()
+        if self.legal_actions is not None:
+            return line if line in self.legal_actions else None
+        return line if line.startswith(ACTION_PREFIXES) else None
@@ -0,0 +1,221 @@
+import asyncio
+import contextlib
+import contextvars
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import torch
+from transformers import StoppingCriteriaList
+
+from agents.decoding import StopSequence, StopSequenceCriteria, truncate_at_stop
+from agents.executor import InferenceExecutor, default_executor
+from agents.models import SAMPLING_LOCK, SmollLLM
+from game_mcp import profiling
+
+# Parameters of a request that need a generate() call of its own
+UNBATCHED_PARAMS = ("seed", "streamer", "stopping_criteria", "logits_processor", "past_key_values")
+
+
+class BatchScheduler:
+    """
+    Collects concurrent generation requests for one SmollLLM and runs them as batches.
+
+    Creating a scheduler opts the model in: from then on, its 'agenerate' queues every
+    request that can share a generate() call with others, and 'close' opts it out again.
+    Requests from any number of games and roles are queued. The scheduler waits at most
+    'max_wait' seconds after the first request for more to arrive, left-pads the prompts
+    of requests with equal generation parameters into one batch, runs 'model.generate'
+    once per batch and hands each completion back to its awaiting coroutine.
+
+    Batched requests are answered from and stored in the model's response cache and
+    honour stop sequences. Each row prefills its whole prompt, so the prefix cache and
+    prompt-lookup decoding only serve the unbatched requests. Seeded requests, whose
+    sampling must not depend on the rest of the batch, are never batched.
+    """
+
+    def __init__(
+            self,
+            model: SmollLLM,
+            max_batch_size: int = 8,
+            max_wait: float = 0.02,
+            executor: Optional[InferenceExecutor] = None
+    ) -> None:
+        """
+        :param model: The model to serve. Its weights and tokenizer are used directly.
+        :param max_batch_size: Maximum number of requests generated together.
+        :param max_wait: Seconds to hold the first request of a batch while waiting for more.
+        :param executor: Thread pool batches run on, None for the model's executor.
+        """
+        self.model = model
+        self.executor = executor or model.executor or default_executor()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        model.batcher = self
+
+    @staticmethod
+    def accepts(kwargs: Dict[str, Any]) -> bool:
+        """Whether a request with these generate_response parameters can be batched."""
+        return not any(kwargs.get(name) is not None for name in UNBATCHED_PARAMS)
+
+    async def generate_response(
+            self,
+            messages: List[Dict[str, str]],
+            max_new_tokens: int = 50,
+            temperature: float = 0.7,
+            top_p: float = 0.9,
+            top_k: int = 50,
+            do_sample: bool = True,
+            stop: Optional[Sequence[StopSequence]] = None,
+            **kwargs: Any
+    ) -> str:
+        """
+        Queue a generation request and wait for its batch to complete.
+
+        Takes the same parameters as SmollLLM.generate_response, except for those in
+        UNBATCHED_PARAMS.
+
+        :param messages: A list of { "role": "system"/"user"/"assistant", "content": str }.
+        :param max_new_tokens: Max number of new tokens to generate in the response.
+        :param temperature: Sampling temperature, higher = more random.
+        :param top_p: Nucleus sampling probability cutoff.
+        :param top_k: Top-k filtering cutoff.
+        :param do_sample: Whether or not to sample (True) or do greedy decode (False).
+        :param stop: Stop sequences, as in SmollLLM.generate_response.
+        :param kwargs: Additional parameters to pass to model.generate().
+        :return: The generated text as a string.
+        """
+        if not self.accepts(kwargs):
+            raise ValueError(f"Requests with any of {UNBATCHED_PARAMS} cannot be batched")
+
+        # The same key as an unbatched call, so both paths share the cached responses
+        cache_key = self.model.cache_key("generate_response", messages, dict(
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            stop=stop,
+            seed=None,
+            **kwargs
+        ))
+        if cache_key is not None:
+            cached = self.model.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            # Start the worker in an empty context, so its batches do not count towards
+            # the profiled phases of whichever game happened to arrive first
+            self._worker = contextvars.Context().run(asyncio.get_running_loop().create_task, self._serve())
+
+        params = dict(
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            stop=stop,
+            **kwargs
+        )
+        with profiling.span("model.format_prompt"):
+            prompt = self.model.format_prompt(messages, add_generation_prompt=True)
+        future = asyncio.get_running_loop().create_future()
+        with profiling.span("model.batched_generate"):
+            await self._queue.put((prompt, params, future))
+            text = await future
+
+        if cache_key is not None:
+            self.model.response_cache.put(cache_key, text)
+        return text
+
+    async def close(self) -> None:
+        """Stop the background worker and opt the model out. Requests still queued are cancelled."""
+        if self.model.batcher is self:
+            self.model.batcher = None
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue is not None and not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            future.cancel()
+
+    async def _serve(self) -> None:
+        """Form batches from the queue until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Only requests with identical generation parameters can share a generate() call
+            groups: Dict[str, List[Tuple[str, Dict[str, Any], asyncio.Future]]] = {}
+            for request in batch:
+                groups.setdefault(repr(sorted(request[1].items())), []).append(request)
+
+            for group in groups.values():
+                prompts = [prompt for prompt, _, _ in group]
+                try:
+                    texts = await self.executor.run(self._generate_batch, prompts, group[0][1])
+                except Exception as exc:
+                    for _, _, future in group:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+
+                self.batches += 1
+                self.requests += len(group)
+                for (_, _, future), text in zip(group, texts):
+                    if not future.done():
+                        future.set_result(text)
+
+    def _generate_batch(self, prompts: List[str], params: Dict[str, Any]) -> List[str]:
+        """Run one left-padded generate() call and decode the new tokens of every row."""
+        tokenizer = self.model.tokenizer
+        params = dict(params)
+        stop = params.pop("stop")
+        # Small chat models often have no pad token; the padded positions are masked out anyway
+        pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+        with profiling.span("model.tokenize", rows=len(prompts)):
+            rows = [tokenizer.encode(prompt) for prompt in prompts]
+            width = max(len(row) for row in rows)
+            input_ids = torch.tensor(
+                [[pad_token_id] * (width - len(row)) + row for row in rows], device=self.model.device
+            )
+            attention_mask = torch.tensor(
+                [[0] * (width - len(row)) + [1] * len(row) for row in rows], device=self.model.device
+            )
+        if stop:
+            # Rows are stopped one by one, the batch runs on while any row is unfinished
+            params["stopping_criteria"] = StoppingCriteriaList([StopSequenceCriteria(tokenizer, width, stop)])
+
+        # Batches are never seeded, but must not draw random numbers while a seeded call runs
+        lock = SAMPLING_LOCK.shared() if params.get("do_sample") else contextlib.nullcontext()
+        with profiling.span("model.batch_generate", rows=len(prompts)), lock, torch.no_grad():
+            outputs = self.model.model.generate(
+                input_ids,
+                attention_mask=attention_mask,
+                pad_token_id=pad_token_id,
+                **params
+            )
+
+        with profiling.span("model.detokenize", rows=len(prompts)):
+            texts = tokenizer.batch_decode(outputs[:, width:], skip_special_tokens=True)
+            if stop:
+                texts = [truncate_at_stop(text, stop) for text in texts]
+        return texts
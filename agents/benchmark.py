@@ -0,0 +1,245 @@
+"""
+CPU inference benchmarks for the agent models.
+
+    python -m agents.benchmark prompt-lookup --prompts 16 --max-new-tokens 64
+    python -m agents.benchmark precision --modes fp32 bf16 int8 --games 20
+
+Prompts are built from seeded bombs, so every run and every configuration
+sees the same Expert and Defuser inputs.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from agents.models import HFModel, SmollLLM
+from agents.prompts import defuser_prompt, expert_prompt
+from agents.two_agents import run_two_agents
+from game.bomb import MODULE_FACTORIES, Bomb
+from game_mcp.protocol import state_text
+
+Messages = List[Dict[str, str]]
+
+DEFUSER_ADVICE = "Follow the manual and answer with exactly one of the available commands."
+
+
+def sample_prompts(count: int, seed: int = 0) -> Dict[str, List[Messages]]:
+    """
+    Build 'count' Expert and 'count' Defuser prompts from the modules of seeded bombs.
+
+    :param count: Number of prompts per role.
+    :param seed: Seed of the bomb generator.
+    :return: The prompts by role.
+    """
+    rng = random.Random(seed)
+    prompts: Dict[str, List[Messages]] = {"expert": [], "defuser": []}
+    while len(prompts["expert"]) < count:
+        for name in MODULE_FACTORIES:
+            bomb = Bomb(rng.getrandbits(64), [name])
+            # The exact text the server reports, module header included
+            state = state_text(bomb)
+            prompts["expert"].append(expert_prompt(bomb.module.instruction(), state))
+            prompts["defuser"].append(defuser_prompt(state, DEFUSER_ADVICE))
+    return {role: role_prompts[:count] for role, role_prompts in prompts.items()}
+
+
+def time_greedy(model: HFModel, prompts: List[Messages], max_new_tokens: int) -> Tuple[List[str], float, int]:
+    """
+    Generate greedily for every prompt.
+
+    :return: The outputs, the total wall-clock seconds and the number of generated tokens.
+    """
+    outputs = []
+    start = time.perf_counter()
+    for messages in prompts:
+        outputs.append(model.generate_response(
+            messages,
+            max_new_tokens=max_new_tokens,
+            temperature=None,
+            top_p=None,
+            top_k=None,
+            do_sample=False
+        ))
+    seconds = time.perf_counter() - start
+    tokens = sum(len(model.tokenizer.encode(text, add_special_tokens=False)) for text in outputs)
+    return outputs, seconds, tokens
+
+
+def benchmark_prompt_lookup(
+        checkpoint: str,
+        device: str = "cpu",
+        prompts: int = 16,
+        max_new_tokens: int = 64,
+        num_tokens: int = 10,
+        max_ngram: int = 3
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare plain greedy decoding against prompt-lookup decoding, per role.
+
+    Both models share the checkpoint's weights and run without prefix caching,
+    so the difference is due to speculative decoding alone.
+
+    :return: Per role: seconds and tokens/second of both modes, the speedup and how
+             many outputs are exactly identical.
+    """
+    baseline = SmollLLM(checkpoint, device=device, prefix_cache_bytes=0)
+    lookup = SmollLLM(
+        checkpoint,
+        device=device,
+        prefix_cache_bytes=0,
+        prompt_lookup_num_tokens=num_tokens,
+        prompt_lookup_max_ngram=max_ngram
+    )
+
+    results = {}
+    for role, role_prompts in sample_prompts(prompts).items():
+        # Warm up both paths so one-off allocations are not timed
+        time_greedy(baseline, role_prompts[:1], max_new_tokens)
+        time_greedy(lookup, role_prompts[:1], max_new_tokens)
+
+        base_out, base_s, base_tokens = time_greedy(baseline, role_prompts, max_new_tokens)
+        look_out, look_s, look_tokens = time_greedy(lookup, role_prompts, max_new_tokens)
+        results[role] = {
+            "prompts": len(role_prompts),
+            "baseline_seconds": base_s,
+            "baseline_tokens_per_second": base_tokens / base_s,
+            "lookup_seconds": look_s,
+            "lookup_tokens_per_second": look_tokens / look_s,
+            "speedup": base_s / look_s,
+            "identical_outputs": sum(a == b for a, b in zip(base_out, look_out)),
+        }
+    return results
+
+
+def measure_precision(
+        checkpoint: str,
+        device: str,
+        precision: str,
+        compile: bool,
+        prompts: int,
+        max_new_tokens: int,
+        games: int = 0,
+        server_url: Optional[str] = None,
+        max_turns: int = 30
+) -> Dict[str, Any]:
+    """
+    Load a checkpoint in one inference mode and measure it.
+
+    Meant to run in a fresh process, so that the peak resident memory belongs to this mode only.
+
+    :return: Load time, first-token latency, tokens/second and peak resident memory, plus
+             win rate and mean modules solved over 'games' games if a server URL is given.
+    """
+    start = time.perf_counter()
+    model = SmollLLM(checkpoint, device=device, precision=precision, compile=compile, prefix_cache_bytes=0)
+    load_seconds = time.perf_counter() - start
+
+    role_prompts = sample_prompts(prompts)["expert"]
+    _, first_token_seconds, _ = time_greedy(model, role_prompts, max_new_tokens=1)
+    _, seconds, tokens = time_greedy(model, role_prompts, max_new_tokens)
+
+    row: Dict[str, Any] = {
+        "load_seconds": load_seconds,
+        "first_token_ms": 1000 * first_token_seconds / len(role_prompts),
+        "tokens_per_second": tokens / seconds,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+    if games and server_url:
+        results = [
+            asyncio.run(run_two_agents(model, model, server_url, max_turns=max_turns, verbose=False))
+            for _ in range(games)
+        ]
+        row["win_rate"] = sum(r.disarmed for r in results) / games
+        row["mean_modules_solved"] = sum(r.modules_solved for r in results) / games
+    return row
+
+
+def benchmark_precision(
+        checkpoint: str,
+        device: str = "cpu",
+        modes: Sequence[str] = ("fp32", "bf16", "int8"),
+        compile: bool = False,
+        prompts: int = 8,
+        max_new_tokens: int = 64,
+        games: int = 0,
+        server_url: Optional[str] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Measure every inference precision in its own process.
+
+    :return: The measurements of 'measure_precision' by mode.
+    """
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for mode in modes:
+        name = f"{mode}+compile" if compile else mode
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results[name] = pool.submit(
+                measure_precision,
+                checkpoint, device, mode, compile, prompts, max_new_tokens, games, server_url
+            ).result()
+    return results
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    """Print one row per result with its numeric fields."""
+    for name, row in results.items():
+        fields = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items())
+        print(f"{name:>10}: {fields}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU inference of the agent models")
+    parser.add_argument("--checkpoint", default="HuggingFaceTB/SmolLM-135M-Instruct")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    lookup_parser = subparsers.add_parser("prompt-lookup", help="Prompt-lookup speculative decoding vs. greedy")
+    lookup_parser.add_argument("--prompts", type=int, default=16, help="Prompts per role")
+    lookup_parser.add_argument("--max-new-tokens", type=int, default=64)
+    lookup_parser.add_argument("--num-tokens", type=int, default=10, help="Max drafted tokens per step")
+    lookup_parser.add_argument("--max-ngram", type=int, default=3, help="Longest n-gram matched in the prompt")
+
+    precision_parser = subparsers.add_parser("precision", help="Inference precisions: speed, memory and win rate")
+    precision_parser.add_argument("--modes", nargs="+", default=["fp32", "bf16", "int8"])
+    precision_parser.add_argument("--compile", action="store_true", help="Also wrap the model in torch.compile")
+    precision_parser.add_argument("--prompts", type=int, default=8)
+    precision_parser.add_argument("--max-new-tokens", type=int, default=64)
+    precision_parser.add_argument("--games", type=int, default=0, help="Games per mode for the win rate")
+    precision_parser.add_argument("--server-url", default="http://0.0.0.0:8080")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "prompt-lookup":
+        results = benchmark_prompt_lookup(
+            args.checkpoint,
+            device=args.device,
+            prompts=args.prompts,
+            max_new_tokens=args.max_new_tokens,
+            num_tokens=args.num_tokens,
+            max_ngram=args.max_ngram
+        )
+    elif args.benchmark == "precision":
+        results = benchmark_precision(
+            args.checkpoint,
+            device=args.device,
+            modes=args.modes,
+            compile=args.compile,
+            prompts=args.prompts,
+            max_new_tokens=args.max_new_tokens,
+            games=args.games,
+            server_url=args.server_url
+        )
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
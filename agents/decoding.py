@@ -0,0 +1,241 @@
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Pattern, Sequence, Union
+
+import torch
+from transformers import LogitsProcessor, PreTrainedTokenizer, StoppingCriteria, TextStreamer
+
+# Trie key marking that the path from the root spells a complete action
+END = -1
+
+
+class ActionTrie:
+    """
+    Token-level prefix tree over a set of action strings.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizer, actions: Sequence[str]) -> None:
+        """
+        :param tokenizer: The tokenizer of the model that will generate the actions.
+        :param actions: The strings generation is restricted to.
+        """
+        self.root: Dict[int, dict] = {}
+        self.depth = 0
+        for action in actions:
+            token_ids = tokenizer.encode(action, add_special_tokens=False)
+            node = self.root
+            for token_id in token_ids:
+                node = node.setdefault(token_id, {})
+            node[END] = action
+            self.depth = max(self.depth, len(token_ids))
+
+    def walk(self, token_ids: Sequence[int]) -> Optional[dict]:
+        """
+        Follow 'token_ids' from the root.
+
+        :return: The node reached, or None if the tokens leave the trie.
+        """
+        node = self.root
+        for token_id in token_ids:
+            node = node.get(token_id)
+            if node is None:
+                return None
+        return node
+
+    def match(self, token_ids: Sequence[int]) -> Optional[str]:
+        """Return the action spelled by 'token_ids', if they spell a complete one."""
+        node = self.walk(token_ids)
+        return node.get(END) if node is not None else None
+
+    def completions(self, token_ids: Sequence[int]) -> List[str]:
+        """The actions that 'token_ids' spell or are the beginning of."""
+        node = self.walk(token_ids)
+        found: List[str] = []
+        stack = [node] if node is not None else []
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key == END:
+                    found.append(child)
+                else:
+                    stack.append(child)
+        return found
+
+
+class ActionLogitsProcessor(LogitsProcessor):
+    """
+    Masks every token that would leave the action trie.
+
+    Where a complete action can still be extended into a longer one, the end-of-sequence
+    token is allowed too, so generation may stop there.
+    """
+
+    def __init__(self, trie: ActionTrie, prompt_length: int, eos_token_id: int) -> None:
+        self.trie = trie
+        self.prompt_length = prompt_length
+        self.eos_token_id = eos_token_id
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        mask = torch.full_like(scores, float("-inf"))
+        for row, sequence in enumerate(input_ids):
+            node = self.trie.walk(sequence[self.prompt_length:].tolist())
+            allowed: List[int] = [token_id for token_id in (node or {}) if token_id != END]
+            if node is None or END in node:
+                allowed.append(self.eos_token_id)
+            mask[row, allowed] = 0
+        return scores + mask
+
+
+class ActionStoppingCriteria(StoppingCriteria):
+    """
+    Stops a sequence as soon as it spells an action that cannot be extended further.
+    """
+
+    def __init__(self, trie: ActionTrie, prompt_length: int) -> None:
+        self.trie = trie
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        done = []
+        for sequence in input_ids:
+            node = self.trie.walk(sequence[self.prompt_length:].tolist())
+            done.append(node is None or (END in node and len(node) == 1))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+StopSequence = Union[str, Pattern[str]]
+
+
+class StopSequenceCriteria(StoppingCriteria):
+    """
+    Stops a sequence once its generated text contains a stop sequence.
+
+    Plain strings are matched literally, compiled patterns with search(). Leading
+    whitespace of the generated text is ignored, so a newline stop does not fire
+    before the reply has started.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizer, prompt_length: int, stop: Sequence[StopSequence]) -> None:
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.patterns = compile_stop_sequences(stop)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        done = []
+        for sequence in input_ids:
+            text = self.tokenizer.decode(sequence[self.prompt_length:], skip_special_tokens=True).lstrip()
+            done.append(any(pattern.search(text) for pattern in self.patterns))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+def compile_stop_sequences(stop: Sequence[StopSequence]) -> List[Pattern[str]]:
+    """Turn plain stop strings into literal patterns and keep compiled patterns as they are."""
+    return [re.compile(re.escape(s)) if isinstance(s, str) else s for s in stop]
+
+
+def truncate_at_stop(text: str, stop: Sequence[StopSequence]) -> str:
+    """
+    Cut generated text at the earliest stop sequence.
+
+    A plain string is a terminator and is removed along with everything after it.
+    A compiled pattern describes a completed unit, such as a full command line, and
+    the text is kept up to the end of its match.
+
+    :param text: The generated text.
+    :param stop: The stop sequences the generation was run with.
+    :return: The text up to the first stop.
+    """
+    offset = len(text) - len(text.lstrip())
+    cut = len(text)
+    for s, pattern in zip(stop, compile_stop_sequences(stop)):
+        match = pattern.search(text, offset)
+        if match:
+            cut = min(cut, match.start() if isinstance(s, str) else match.end())
+    return text[:cut]
+
+
+class StopTextFilter:
+    """
+    Passes streamed text on to a callback, cut at the first stop sequence as
+    'truncate_at_stop' cuts a complete reply.
+
+    The end of the text that could still become a plain stop string is held back until
+    the next piece shows whether it does, so no part of a terminator is passed on.
+    """
+
+    def __init__(self, stop: Sequence[StopSequence], emit: Callable[[str], None]) -> None:
+        """
+        :param stop: The stop sequences the generation runs with.
+        :param emit: Called with every piece of text that is certain to be kept.
+        """
+        self.stop = stop
+        self.emit = emit
+        self.strings = [s for s in stop if isinstance(s, str)]
+        self.text = ""
+        self.emitted = 0
+
+    def feed(self, delta: str) -> None:
+        """Add a piece of generated text."""
+        self.text += delta
+        kept = truncate_at_stop(self.text, self.stop)
+        if len(kept) == len(self.text):
+            held = max((k for s in self.strings for k in range(1, len(s)) if kept.endswith(s[:k])), default=0)
+            kept = kept[:len(kept) - held]
+        self._emit(kept)
+
+    def flush(self) -> None:
+        """Pass on the held back text once generation has ended."""
+        self._emit(truncate_at_stop(self.text, self.stop))
+
+    def _emit(self, kept: str) -> None:
+        if len(kept) > self.emitted:
+            self.emit(kept[self.emitted:])
+            self.emitted = len(kept)
+
+
+class CallbackStreamer(TextStreamer):
+    """
+    Hands the text of newly generated tokens to a callback as generate() produces them,
+    on the generating thread, instead of printing it.
+    """
+
+    def __init__(self, tokenizer: PreTrainedTokenizer, callback: Callable[[str], None], **decode_kwargs) -> None:
+        """
+        :param tokenizer: The tokenizer of the generating model.
+        :param callback: Called with every piece of decoded text.
+        :param decode_kwargs: Parameters of tokenizer.decode(), e.g. skip_special_tokens.
+        """
+        super().__init__(tokenizer, skip_prompt=True, **decode_kwargs)
+        self.callback = callback
+
+    def on_finalized_text(self, text: str, stream_end: bool = False) -> None:
+        if text:
+            self.callback(text)
+
+
+class CancelCriteria(StoppingCriteria):
+    """
+    Stops all sequences once 'event' is set, e.g. by a consumer that has seen enough.
+    """
+
+    def __init__(self, event: threading.Event) -> None:
+        self.event = event
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class FirstTokenTimer(StoppingCriteria):
+    """
+    Never stops generation; notes when the first new token exists, which separates
+    the prefill of the prompt from the token-by-token decode.
+    """
+
+    def __init__(self) -> None:
+        self.first_token_time: Optional[float] = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        return torch.zeros((input_ids.shape[0],), dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,94 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import torch
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for blocking model calls.
+
+    Coroutines submit inference work here instead of calling torch on the event loop,
+    so network I/O and other games keep running during generation. At most
+    'max_pending' calls per event loop may be queued or running at once; further
+    callers wait asynchronously for a free slot.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 16, torch_threads: Optional[int] = None) -> None:
+        """
+        :param workers: Number of inference threads. Generations run side by side, except that
+               a seeded one runs alone among the sampled ones (see SmollLLM._generate).
+        :param max_pending: Bound on queued plus running calls per event loop.
+        :param torch_threads: Intra-op thread count for torch, None to keep the default. torch has
+               one such setting per process, not per thread, so this sets it for the whole process,
+               including other executors and the main thread.
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.torch_threads = torch_threads
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="inference",
+            initializer=self._init_worker,
+        )
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _init_worker(self) -> None:
+        # Process-wide: the last executor to start a worker decides for everyone
+        if self.torch_threads:
+            torch.set_num_threads(self.torch_threads)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+        Schedule 'fn(*args, **kwargs)' on an inference thread, e.g. from synchronous code.
+
+        Synchronous callers are not counted towards 'max_pending'.
+
+        :return: The future of the call's result.
+        """
+        # Run in a copy of the caller's context, as asyncio.to_thread does, so that
+        # context variables such as the profiling phase totals carry over
+        context = contextvars.copy_context()
+        return self._pool.submit(functools.partial(context.run, fn, *args, **kwargs))
+
+    def slot(self) -> asyncio.Semaphore:
+        """
+        The pending-call slots of the running event loop. Hold one while awaiting work
+        submitted directly, e.g. 'async with executor.slot():'.
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+        return slots
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run 'fn(*args, **kwargs)' on an inference thread and await its result.
+        """
+        async with self.slot():
+            return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker threads once their current calls finish."""
+        self._pool.shutdown(wait=wait)
+
+
+_default_executor: Optional[InferenceExecutor] = None
+_default_lock = threading.Lock()
+
+
+def default_executor() -> InferenceExecutor:
+    """The executor used by models that were not given one, created on first use."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = InferenceExecutor()
+        return _default_executor
@@ -0,0 +1,130 @@
+import functools
+import re
+from typing import Callable, Dict, Optional, Pattern, Tuple
+
+# Per module id: the line that opens a section and how to name the section from that match
+SECTION_STARTS: Dict[str, Tuple[Pattern[str], Callable[[re.Match], str]]] = {
+    "RegularWiresModule": (
+        re.compile(r"^- (\d)-Wire Case:"),
+        lambda m: f"wires-{m.group(1)}",
+    ),
+    "ButtonModule": (
+        re.compile(r"^\d\. (Primary Analysis|Releasing a Held Button)"),
+        lambda m: "press" if m.group(1) == "Primary Analysis" else "release",
+    ),
+    "SimonSaysModule": (
+        re.compile(r"^- If the serial number (contains a vowel|does NOT contain a vowel)"),
+        lambda m: "vowel" if m.group(1) == "contains a vowel" else "no-vowel",
+    ),
+    "MemoryModule": (
+        re.compile(r"^Stage (\d):"),
+        lambda m: f"stage-{m.group(1)}",
+    ),
+}
+
+# Lines that close the last section and start general notes that apply to every section
+OUTRO_START = re.compile(r"^(Note:|For each color that flashes)")
+
+
+def _wire_count(state: str) -> Optional[str]:
+    count = len(re.findall(r"^Wire \d+:", state, re.MULTILINE))
+    return f"wires-{count}" if count else None
+
+
+def _button_phase(state: str) -> Optional[str]:
+    return "release" if "You are holding the button" in state else "press"
+
+
+def _simon_table(state: str) -> Optional[str]:
+    match = re.search(r"^Serial number: (\w+)", state, re.MULTILINE)
+    if not match:
+        return None
+    return "vowel" if any(c in "AEIOU" for c in match.group(1).upper()) else "no-vowel"
+
+
+def _memory_stage(state: str) -> Optional[str]:
+    match = re.search(r"^Stage (\d)/\d", state, re.MULTILINE)
+    return f"stage-{match.group(1)}" if match else None
+
+
+# Per module id: which section applies to a Defuser's state description
+APPLICABLE_SECTION: Dict[str, Callable[[str], Optional[str]]] = {
+    "RegularWiresModule": _wire_count,
+    "ButtonModule": _button_phase,
+    "SimonSaysModule": _simon_table,
+    "MemoryModule": _memory_stage,
+}
+
+
+class ManualIndex:
+    """
+    A module manual split into an introduction, addressable sections and closing notes.
+    """
+
+    def __init__(self, manual_text: str, module_id: Optional[str]) -> None:
+        """
+        :param manual_text: The full manual of the module.
+        :param module_id: The module id the manual belongs to, e.g. 'RegularWiresModule'.
+        """
+        self.manual_text = manual_text
+        self.module_id = module_id
+        self.intro = ""
+        self.outro = ""
+        self.sections: Dict[str, str] = {}
+
+        if module_id not in SECTION_STARTS:
+            return
+        start, name = SECTION_STARTS[module_id]
+
+        current: Optional[str] = None
+        chunks: Dict[Optional[str], list] = {None: []}
+        for line in manual_text.splitlines():
+            match = start.match(line)
+            if match:
+                current = name(match)
+                chunks[current] = []
+            elif OUTRO_START.match(line):
+                current = "outro"
+                chunks[current] = []
+            chunks[current].append(line)
+
+        self.intro = "\n".join(chunks.pop(None)).strip()
+        self.outro = "\n".join(chunks.pop("outro", [])).strip()
+        self.sections = {key: "\n".join(lines).strip() for key, lines in chunks.items()}
+
+    def section_for(self, state_text: str) -> Optional[str]:
+        """Name of the section that applies to 'state_text', if it can be told."""
+        predicate = APPLICABLE_SECTION.get(self.module_id)
+        key = predicate(state_text) if predicate else None
+        return key if key in self.sections else None
+
+    def select(self, state_text: str) -> str:
+        """
+        The parts of the manual that apply to the current state.
+
+        :param state_text: The bomb state as described by the Defuser.
+        :return: Introduction, the applicable section and closing notes, or the whole
+                 manual when no single section can be determined.
+        """
+        key = self.section_for(state_text)
+        if key is None:
+            return self.manual_text
+        return "\n\n".join(part for part in (self.intro, self.sections[key], self.outro) if part)
+
+
+@functools.lru_cache(maxsize=64)
+def index_manual(manual_text: str, module_id: Optional[str]) -> ManualIndex:
+    """Index a manual once; the same manual text is indexed on every turn of its module."""
+    return ManualIndex(manual_text, module_id)
+
+
+def relevant_manual(manual_text: str, module_id: Optional[str], state_text: str) -> str:
+    """
+    Retrieve only the manual section that applies to the current state.
+
+    :param manual_text: The full manual of the current module.
+    :param module_id: The module id reported with the state.
+    :param state_text: The bomb state as described by the Defuser.
+    :return: The relevant excerpt, or the full manual if none can be chosen.
+    """
+    return index_manual(manual_text, module_id).select(state_text)
@@ -0,0 +1,133 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+MEMORY_STAGE = re.compile(r"^Stage (\d)/\d", re.MULTILINE)
+MEMORY_BUTTON = re.compile(r"^Position (\d): Button labeled (\d)", re.MULTILINE)
+MEMORY_PRESS = re.compile(r"^press position (\d)$")
+SIMON_ROUND = re.compile(r"^Round: (\d)/\d", re.MULTILINE)
+SIMON_INPUTS = re.compile(r"^Your inputs so far: (.*)$", re.MULTILINE)
+SIMON_PRESS = re.compile(r"^press (red|blue|green|yellow)$")
+
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count for when no tokenizer is at hand: about four characters per token."""
+    return (len(text) + 3) // 4
+
+
+def accepted(response: str) -> bool:
+    """Whether the server accepted an action, i.e. it neither exploded nor was rejected."""
+    return response.startswith("The module state has changed") or "DISARMED" in response
+
+
+@dataclass
+class Turn:
+    """One exchange, kept verbatim while it is recent."""
+    advice: str
+    action: str
+    # First line of the server's response; the new state itself is part of the next prompt
+    result: str
+
+
+class ConversationMemory:
+    """
+    What happened earlier in the current module, for prompts that are otherwise stateless.
+
+    The most recent turns are kept verbatim. Older turns are compacted into the facts
+    the module rules refer back to: the position and label pressed in each Memory
+    stage and the presses accepted in each Simon Says round. The rendered memory
+    stays under a token budget, so prefill cost stays flat however long a module takes.
+    Everything is forgotten when the bomb moves on to the next module.
+    """
+
+    def __init__(
+            self,
+            token_budget: int = 256,
+            recent_turns: int = 2,
+            count_tokens: Optional[Callable[[str], int]] = None
+    ) -> None:
+        """
+        :param token_budget: Upper bound on the tokens of the rendered memory.
+        :param recent_turns: How many of the latest turns are kept verbatim.
+        :param count_tokens: Token counter, e.g. of the model's tokenizer; approximated by default.
+        """
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.count_tokens = count_tokens or approximate_tokens
+        self.module_index: Optional[int] = None
+        self.facts: Dict[str, str] = {}
+        self.turns: List[Turn] = []
+
+    def record(self, module_index: Optional[int], state: str, advice: str, action: str, response: str) -> None:
+        """
+        Remember a turn.
+
+        :param module_index: Index of the module the turn was played on.
+        :param state: The state the action was chosen in.
+        :param advice: The Expert's advice.
+        :param action: The Defuser's action.
+        :param response: The server's response to the action.
+        """
+        if module_index != self.module_index:
+            self.clear()
+            self.module_index = module_index
+
+        if accepted(response):
+            self._extract_facts(state, action)
+        self.turns.append(Turn(advice.strip(), action, response.strip().partition("\n")[0]))
+        # Older turns live on only as facts
+        del self.turns[:len(self.turns) - self.recent_turns]
+
+    def clear(self) -> None:
+        """Forget everything, e.g. when the bomb moves on to the next module."""
+        self.module_index = None
+        self.facts.clear()
+        self.turns.clear()
+
+    def render(self, module_index: Optional[int] = None) -> str:
+        """
+        The memory as prompt text within the token budget: facts first, then recent turns.
+
+        :param module_index: The current module; nothing is rendered for a module that was not recorded.
+        :return: The text, empty if there is nothing to remember.
+        """
+        if module_index != self.module_index:
+            return ""
+
+        facts = [f"- {key}: {value}" for key, value in self.facts.items()]
+        recent = list(self.turns)
+        while True:
+            text = self._format(facts, recent)
+            if self.count_tokens(text) <= self.token_budget:
+                return text
+            if recent:
+                recent = recent[1:]
+            elif facts:
+                # Only the rules of later stages refer back, so the oldest facts go last
+                facts = facts[:-1]
+            else:
+                return ""
+
+    def _format(self, facts: List[str], recent: List[Turn]) -> str:
+        parts = []
+        if facts:
+            parts.append("Known so far:\n" + "\n".join(facts))
+        for turn in recent:
+            parts.append(f"Expert advised: {turn.advice}\nDefuser did: {turn.action}\nResult: {turn.result}")
+        return "\n\n".join(parts)
+
+    def _extract_facts(self, state: str, action: str) -> None:
+        stage = MEMORY_STAGE.search(state)
+        press = MEMORY_PRESS.match(action)
+        if stage and press:
+            labels = dict(MEMORY_BUTTON.findall(state))
+            position = press.group(1)
+            self.facts[f"Stage {stage.group(1)}"] = f"pressed position {position}, labeled {labels.get(position, '?')}"
+            return
+
+        round_match = SIMON_ROUND.search(state)
+        press = SIMON_PRESS.match(action)
+        if round_match and press:
+            inputs = SIMON_INPUTS.search(state)
+            presses = inputs.group(1).split(", ") if inputs else []
+            self.facts[f"Round {round_match.group(1)} presses"] = ", ".join(presses + [press.group(1)])
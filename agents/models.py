@@ -1,7 +1,75 @@
+import asyncio
+import contextlib
+import queue
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Sequence
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, PreTrainedModel, PreTrainedTokenizer
+import transformers
+from transformers import (
+    LogitsProcessorList, PreTrainedModel, PreTrainedTokenizer, StoppingCriteriaList
+)
+
+from agents.actions import COMMAND_LINE, FALLBACK_ACTION, IncrementalActionParser
+from agents.decoding import (
+    ActionLogitsProcessor, ActionStoppingCriteria, ActionTrie, CallbackStreamer, CancelCriteria, FirstTokenTimer,
+    StopSequence, StopSequenceCriteria, StopTextFilter, truncate_at_stop
+)
+from agents.executor import InferenceExecutor, default_executor
+from agents.prefix_cache import PrefixCache
+from agents.registry import registry
+from agents.response_cache import ResponseCache
+from game_mcp import profiling
+
+if TYPE_CHECKING:
+    from agents.batching import BatchScheduler
+
+class SamplingLock:
+    """
+    Keeps seeded generations apart from all other sampled ones, see SmollLLM._generate.
+
+    Unseeded sampled generations hold it shared and run side by side; a seeded one holds
+    it exclusively, so that nothing else draws from torch's random generator meanwhile.
+    Waiting seeded generations go first, so a steady stream of unseeded ones cannot starve them.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextlib.contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive and not self._waiting)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._shared -= 1
+                self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._condition:
+            self._waiting += 1
+            try:
+                self._condition.wait_for(lambda: not self._exclusive and not self._shared)
+            finally:
+                self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+
+SAMPLING_LOCK = SamplingLock()
 
 
 class HFModel(ABC):
@@ -10,17 +78,87 @@ class HFModel(ABC):
     Subclasses must implement 'generate_response'.
     """
 
-    def __init__(self, checkpoint: str, device: str = "cpu") -> None:
+    def __init__(
+            self,
+            checkpoint: str,
+            device: str = "cpu",
+            precision: str = "fp32",
+            compile: bool = False,
+            mmap: bool = False,
+            executor: Optional[InferenceExecutor] = None,
+            response_cache: Optional[ResponseCache] = None
+    ) -> None:
         """
         Initialize a Hugging Face model and tokenizer.
 
+        The weights come from the process-wide model registry, so models created for the
+        same checkpoint, device and precision (e.g. a Defuser and an Expert) share one copy.
+
         :param checkpoint: The model checkpoint name or path (from Hugging Face Hub).
         :param device: The device on which to load the model ('cpu' or 'cuda').
+        :param precision: Inference precision: 'fp32', 'bf16' (where the device supports it)
+               or 'int8' (dynamic quantization of the linear layers, CPU only).
+        :param compile: Wrap the model's forward pass in torch.compile.
+        :param mmap: Load the weights from memory-mapped safetensors on first load.
+        :param executor: Thread pool for the async methods, None for the shared default pool.
+        :param response_cache: Memoizes deterministic generations (greedy, or sampled with a
+               fixed 'seed'), so repeated prompts skip inference. None disables it.
         """
         self.checkpoint = checkpoint
         self.device = device
-        self.tokenizer: PreTrainedTokenizer = AutoTokenizer.from_pretrained(checkpoint)
-        self.model: PreTrainedModel = AutoModelForCausalLM.from_pretrained(checkpoint).to(device)
+        self.precision = precision
+        self.compile = compile
+        self.executor = executor
+        self.response_cache = response_cache
+        self.tokenizer: PreTrainedTokenizer
+        self.model: PreTrainedModel
+        self.tokenizer, self.model = registry.get(
+            checkpoint, device=device, precision=precision, compile=compile, mmap=mmap
+        )
+
+    def format_prompt(self, messages: List[Dict[str, str]], add_generation_prompt: bool = False) -> str:
+        """
+        Render chat-like messages into the prompt text the model is fed.
+
+        :param messages: A list of { "role": "system"/"user"/"assistant", "content": str }.
+        :param add_generation_prompt: Append the header that opens the assistant's turn.
+        :return: The prompt as a single string.
+        """
+        return self.tokenizer.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=add_generation_prompt
+        )
+
+    def fingerprint(self) -> Dict[str, Any]:
+        """
+        Everything besides the prompt and generation parameters that determines the output,
+        so that cached responses are not reused across checkpoints or inference settings.
+        """
+        return {
+            "class": type(self).__name__,
+            "checkpoint": self.checkpoint,
+            "revision": getattr(self.model.config, "_commit_hash", None),
+            "dtype": str(self.model.dtype),
+            "precision": self.precision,
+            "compile": self.compile,
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+        }
+
+    def cache_key(self, method: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Optional[str]:
+        """
+        Response cache key of a generation, or None if it must not be cached: there is
+        no cache, the generation samples without a fixed seed, or it passes parameters
+        that are not JSON values, see ResponseCache.make_key.
+
+        :param method: The generation method, e.g. 'generate_response'.
+        :param messages: The prompt messages.
+        :param params: All parameters of the call, including 'do_sample' and 'seed'.
+        """
+        if self.response_cache is None:
+            return None
+        if params.get("do_sample") and params.get("seed") is None:
+            return None
+        return self.response_cache.make_key(self.fingerprint(), method, messages, params)
 
     @abstractmethod
     def generate_response(
@@ -31,6 +169,7 @@ class HFModel(ABC):
             top_p: float = 0.9,
             top_k: int = 50,
             do_sample: bool = True,
+            stop: Optional[Sequence[StopSequence]] = None,
             **kwargs: Any
     ) -> str:
         """
@@ -45,14 +184,257 @@ class HFModel(ABC):
         :param top_p: The cumulative probability for nucleus sampling.
         :param top_k: The number of highest probability vocabulary tokens to keep for top-k-filtering.
         :param do_sample: Whether or not to use sampling; use greedy decoding otherwise.
+        :param stop: Stop sequences; generation ends as soon as the reply contains one.
+               Strings are cut off with everything after them, regex patterns are kept
+               up to the end of their match (e.g. a completed command line).
         :param kwargs: Additional model.generate() parameters as needed.
-        :return: The generated text response as a string.
+        :return: The generated text response as a string, without the prompt.
         """
         pass
 
+    def generate_action(
+            self,
+            messages: List[Dict[str, str]],
+            actions: List[str],
+            temperature: float = 0.7,
+            top_p: float = 0.9,
+            top_k: int = 50,
+            do_sample: bool = True,
+            **kwargs: Any
+    ) -> str:
+        """
+        Generate a reply that is restricted to exactly one of 'actions'.
+
+        Subclasses that cannot constrain decoding fall back to this: a free-form reply,
+        stopped after its first command line, of which the first line naming a legal
+        action is taken. A reply without one, or an empty 'actions', gives the harmless
+        FALLBACK_ACTION rather than a guess that could explode the bomb.
+
+        :param messages: A list of dicts representing a chat or conversation context.
+        :param actions: The legal actions, e.g. the bomb state's available commands.
+        :param temperature: The temperature of sampling. Higher values = more random.
+        :param top_p: The cumulative probability for nucleus sampling.
+        :param top_k: The number of highest probability vocabulary tokens to keep for top-k-filtering.
+        :param do_sample: Whether or not to use sampling; use greedy decoding otherwise.
+        :param kwargs: Additional model.generate() parameters as needed.
+        :return: One of 'actions', or FALLBACK_ACTION.
+        """
+        if not actions:
+            return FALLBACK_ACTION
+        reply = self.generate_response(
+            messages,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            stop=[COMMAND_LINE],
+            **kwargs
+        )
+        parser = IncrementalActionParser(actions)
+        parser.feed(reply)
+        return parser.finish(default=FALLBACK_ACTION)
+
+    def stream_response(self, messages: List[Dict[str, str]], **kwargs: Any) -> Iterator[str]:
+        """
+        Yield the response to 'messages' in pieces as it is generated.
+
+        The generation runs as a job of the inference executor, like 'agenerate', while
+        the caller waits for its pieces. Closing the iterator early cancels the rest of
+        the generation.
+
+        :param messages: A list of dicts representing a chat or conversation context.
+        :param kwargs: Parameters of 'generate_response'.
+        :return: An iterator over text deltas.
+        """
+        deltas: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        cancel = threading.Event()
+        job = (self.executor or default_executor()).submit(self._produce, messages, deltas.put, cancel, kwargs)
+        try:
+            for delta in iter(deltas.get, None):
+                yield delta
+        finally:
+            cancel.set()
+            # Wait for the job without raising, so the model is idle again once the stream is closed
+            job.exception()
+        job.result()
+
+    async def astream_response(self, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[str]:
+        """
+        Asynchronous 'stream_response'; waiting for the next delta does not block the event loop.
+
+        The generation holds one of the executor's pending-call slots until it ends.
+
+        :param messages: A list of dicts representing a chat or conversation context.
+        :param kwargs: Parameters of 'generate_response'.
+        :return: An async iterator over text deltas.
+        """
+        executor = self.executor or default_executor()
+        loop = asyncio.get_running_loop()
+        deltas: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        cancel = threading.Event()
+
+        def emit(delta: Optional[str]) -> None:
+            loop.call_soon_threadsafe(deltas.put_nowait, delta)
+
+        async with executor.slot():
+            job = asyncio.wrap_future(executor.submit(self._produce, messages, emit, cancel, kwargs))
+            try:
+                while True:
+                    delta = await deltas.get()
+                    if delta is None:
+                        break
+                    yield delta
+            finally:
+                cancel.set()
+                await asyncio.wait([job])
+            job.result()
+
+    def _produce(
+            self,
+            messages: List[Dict[str, str]],
+            emit: Callable[[Optional[str]], None],
+            cancel: threading.Event,
+            kwargs: Dict[str, Any]
+    ) -> None:
+        """Run '_stream' for a stream and tell it the end with None, however the generation ends."""
+        try:
+            # A stream closed before its job started has nothing left to generate
+            if not cancel.is_set():
+                self._stream(messages, emit, cancel, **kwargs)
+        finally:
+            emit(None)
+
+    def _stream(
+            self,
+            messages: List[Dict[str, str]],
+            emit: Callable[[str], None],
+            cancel: threading.Event,
+            **kwargs: Any
+    ) -> None:
+        """
+        Generate the response to 'messages', passing its text to 'emit' piece by piece.
+
+        Subclasses that can stream override this and stop soon after 'cancel' is set.
+        Others pass on the whole 'generate_response' output at once.
+
+        :param messages: A list of dicts representing a chat or conversation context.
+        :param emit: Called with every text delta, on the generating thread.
+        :param cancel: Set once the consumer has closed the stream.
+        :param kwargs: Parameters of 'generate_response'.
+        """
+        emit(self.generate_response(messages, **kwargs))
+
+    async def agenerate(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        """
+        Asynchronous 'generate_response' that runs on the inference executor,
+        so the event loop keeps serving other coroutines during generation.
+
+        :param messages: A list of dicts representing a chat or conversation context.
+        :param kwargs: Parameters of 'generate_response'.
+        :return: The generated text response as a string.
+        """
+        return await (self.executor or default_executor()).run(self.generate_response, messages, **kwargs)
+
+    async def agenerate_action(self, messages: List[Dict[str, str]], actions: List[str], **kwargs: Any) -> str:
+        """
+        Asynchronous 'generate_action' that runs on the inference executor.
+
+        :param messages: A list of dicts representing a chat or conversation context.
+        :param actions: The legal actions.
+        :param kwargs: Parameters of 'generate_action'.
+        :return: One of 'actions'.
+        """
+        return await (self.executor or default_executor()).run(self.generate_action, messages, actions, **kwargs)
+
+
+class StaticModel(HFModel):
+    """
+    Base of models without weights whose replies take no inference, such as rule-based
+    or replayed agents. Subclasses implement 'generate_response' and 'generate_action'.
+
+    There is nothing to compute, so streaming yields the whole reply at once and the
+    async methods answer on the event loop instead of hopping to the inference executor.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        :param name: Stands in for the checkpoint and precision, e.g. in tournament results.
+        """
+        # No weights to load: the base initializer is deliberately not called
+        self.checkpoint = name
+        self.precision = name
+        self.compile = False
+        self.executor = None
+        self.response_cache = None
+
+    def stream_response(self, messages: List[Dict[str, str]], **kwargs: Any) -> Iterator[str]:
+        yield self.generate_response(messages, **kwargs)
+
+    async def astream_response(self, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[str]:
+        yield self.generate_response(messages, **kwargs)
+
+    async def agenerate(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        return self.generate_response(messages, **kwargs)
+
+    async def agenerate_action(self, messages: List[Dict[str, str]], actions: List[str], **kwargs: Any) -> str:
+        return self.generate_action(messages, actions, **kwargs)
+
 
 class SmollLLM(HFModel):
 
+    def __init__(
+            self,
+            checkpoint: str,
+            device: str = "cpu",
+            precision: str = "fp32",
+            compile: bool = False,
+            mmap: bool = False,
+            executor: Optional[InferenceExecutor] = None,
+            response_cache: Optional[ResponseCache] = None,
+            prefix_cache_bytes: int = 256 * 1024 ** 2,
+            prompt_lookup_num_tokens: Optional[int] = None,
+            prompt_lookup_max_ngram: int = 3
+    ) -> None:
+        """
+        :param checkpoint: The model checkpoint name or path (from Hugging Face Hub).
+        :param device: The device on which to load the model ('cpu' or 'cuda').
+        :param precision: Inference precision: 'fp32', 'bf16' or 'int8'.
+        :param compile: Wrap the model's forward pass in torch.compile.
+        :param mmap: Load the weights from memory-mapped safetensors on first load.
+        :param executor: Thread pool for the async methods, None for the shared default pool.
+        :param response_cache: Memoizes greedy or fixed-seed generations. None disables it.
+        :param prefix_cache_bytes: Memory budget for reusing the key/value cache of prompt prefixes
+               seen in earlier calls, such as the system message and manual. 0 disables the cache.
+        :param prompt_lookup_num_tokens: Enables prompt-lookup speculative decoding. Continuations of
+               n-grams found in the prompt, up to this many tokens, are drafted and verified in a single
+               forward pass. Suits roles that mostly copy from their prompt, like a Defuser repeating
+               an available command or an Expert quoting the manual. None disables it.
+        :param prompt_lookup_max_ngram: Longest trailing n-gram searched for in the prompt when drafting.
+        """
+        super().__init__(
+            checkpoint,
+            device,
+            precision=precision,
+            compile=compile,
+            mmap=mmap,
+            executor=executor,
+            response_cache=response_cache
+        )
+        self.prefix_cache: Optional[PrefixCache] = PrefixCache(prefix_cache_bytes) if prefix_cache_bytes else None
+        self.prompt_lookup_num_tokens = prompt_lookup_num_tokens
+        self.prompt_lookup_max_ngram = prompt_lookup_max_ngram
+        # Set by an agents.batching.BatchScheduler while it serves this model
+        self.batcher: Optional["BatchScheduler"] = None
+
+    def fingerprint(self) -> Dict[str, Any]:
+        fingerprint = super().fingerprint()
+        if self.prompt_lookup_num_tokens:
+            fingerprint.update(
+                prompt_lookup_num_tokens=self.prompt_lookup_num_tokens,
+                prompt_lookup_max_ngram=self.prompt_lookup_max_ngram
+            )
+        return fingerprint
+
     def generate_response(
             self,
             messages: List[Dict[str, str]],
@@ -61,6 +443,7 @@ class SmollLLM(HFModel):
             top_p: float = 0.9,
             top_k: int = 50,
             do_sample: bool = True,
+            stop: Optional[Sequence[StopSequence]] = None,
             **kwargs: Any
     ) -> str:
         """
@@ -72,33 +455,270 @@ class SmollLLM(HFModel):
         :param top_p: Nucleus sampling probability cutoff.
         :param top_k: Top-k filtering cutoff.
         :param do_sample: Whether or not to sample (True) or do greedy decode (False).
-        :param kwargs: Additional parameters to pass to model.generate().
-        :return: The generated text as a string.
+        :param stop: Stop sequences; strings are cut off, regex patterns kept up to the end of their match.
+        :param kwargs: Additional parameters to pass to model.generate(). 'seed' seeds torch's
+               random number generator first, which makes a sampled response reproducible.
+        :return: The generated text as a string, without the prompt.
         """
+        seed: Optional[int] = kwargs.pop("seed", None)
+        cache_key = self.cache_key("generate_response", messages, dict(
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            stop=stop,
+            seed=seed,
+            **kwargs
+        ))
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         # 1) Build the chat prompt for SmolLM. The custom method
-        #    'apply_chat_template' helps format messages into a single prompt.
-        input_text: str = self.tokenizer.apply_chat_template(messages, tokenize=False)
+        #    'apply_chat_template' helps format messages into a single prompt,
+        #    ending with the header of the assistant's turn.
+        with profiling.span("model.format_prompt"):
+            input_text: str = self.format_prompt(messages, add_generation_prompt=True)
 
         # 2) Tokenize the prompt
-        inputs = self.tokenizer.encode(input_text, return_tensors="pt").to(self.device)
+        with profiling.span("model.tokenize"):
+            inputs = self.tokenizer.encode(input_text, return_tensors="pt").to(self.device)
+        prompt_length = inputs.shape[1]
+        if stop:
+            kwargs["stopping_criteria"] = StoppingCriteriaList([
+                *kwargs.get("stopping_criteria", []), StopSequenceCriteria(self.tokenizer, prompt_length, stop)
+            ])
 
         # 3) Generate output with the provided generation parameters
-        with torch.no_grad():
-            outputs = self.model.generate(
-                inputs,
-                max_new_tokens=max_new_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                do_sample=do_sample,
-                **kwargs
-            )
+        outputs = self._generate(
+            inputs,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            seed=seed,
+            **kwargs
+        )
 
-        # 4) Decode the tokens to a string
-        generated_text: str = self.tokenizer.decode(outputs[0])
+        # 4) Decode only the newly generated tokens to a string
+        with profiling.span("model.detokenize"):
+            generated_text: str = self.tokenizer.decode(outputs.sequences[0, prompt_length:], skip_special_tokens=True)
+            if stop:
+                generated_text = truncate_at_stop(generated_text, stop)
 
+        if cache_key is not None:
+            self.response_cache.put(cache_key, generated_text)
         return generated_text
 
+    def generate_action(
+            self,
+            messages: List[Dict[str, str]],
+            actions: List[str],
+            temperature: float = 0.7,
+            top_p: float = 0.9,
+            top_k: int = 50,
+            do_sample: bool = True,
+            **kwargs: Any
+    ) -> str:
+        """
+        Generates a reply restricted to exactly one of 'actions'.
+
+        Tokens that would leave the token trie of the actions are masked out, and
+        generation stops as soon as a complete action has been produced. A generation
+        cut short before it completes one gives the only action it can still become,
+        or FALLBACK_ACTION where that is not unique.
+
+        :param messages: A list of { "role": "system"/"user"/"assistant", "content": str }.
+        :param actions: The legal actions, e.g. the bomb state's available commands.
+        :param temperature: Sampling temperature, higher = more random.
+        :param top_p: Nucleus sampling probability cutoff.
+        :param top_k: Top-k filtering cutoff.
+        :param do_sample: Whether or not to sample (True) or do greedy decode (False).
+        :param kwargs: Additional parameters to pass to model.generate(); 'seed' as in 'generate_response'.
+        :return: One of 'actions', or FALLBACK_ACTION.
+        """
+        if not actions:
+            # An empty trie would mask every token
+            return FALLBACK_ACTION
+        seed: Optional[int] = kwargs.pop("seed", None)
+        cache_key = self.cache_key("generate_action", messages, dict(
+            actions=actions,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            seed=seed,
+            **kwargs
+        ))
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        with profiling.span("model.format_prompt"):
+            input_text: str = self.format_prompt(messages, add_generation_prompt=True)
+        with profiling.span("model.tokenize"):
+            inputs = self.tokenizer.encode(input_text, return_tensors="pt").to(self.device)
+        prompt_length = inputs.shape[1]
+
+        trie = ActionTrie(self.tokenizer, actions)
+        outputs = self._generate(
+            inputs,
+            max_new_tokens=trie.depth + 1,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            logits_processor=LogitsProcessorList([
+                *kwargs.pop("logits_processor", []),
+                ActionLogitsProcessor(trie, prompt_length, self.tokenizer.eos_token_id)
+            ]),
+            stopping_criteria=StoppingCriteriaList([
+                *kwargs.pop("stopping_criteria", []), ActionStoppingCriteria(trie, prompt_length)
+            ]),
+            seed=seed,
+            **kwargs
+        )
+
+        new_tokens: List[int] = outputs.sequences[0, prompt_length:].tolist()
+        if new_tokens and new_tokens[-1] == self.tokenizer.eos_token_id:
+            new_tokens = new_tokens[:-1]
+        action = trie.match(new_tokens)
+        if action is None:
+            completions = trie.completions(new_tokens)
+            action = completions[0] if len(completions) == 1 else FALLBACK_ACTION
+
+        if cache_key is not None:
+            self.response_cache.put(cache_key, action)
+        return action
+
+    async def agenerate(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        """
+        Asynchronous 'generate_response'. While a BatchScheduler serves the model, requests
+        it can batch are generated together with those of other games.
+
+        :param messages: A list of { "role": "system"/"user"/"assistant", "content": str }.
+        :param kwargs: Parameters of 'generate_response'.
+        :return: The generated text as a string.
+        """
+        if self.batcher is not None and self.batcher.accepts(kwargs):
+            return await self.batcher.generate_response(messages, **kwargs)
+        return await super().agenerate(messages, **kwargs)
+
+    def _stream(
+            self,
+            messages: List[Dict[str, str]],
+            emit: Callable[[str], None],
+            cancel: threading.Event,
+            max_new_tokens: int = 50,
+            temperature: float = 0.7,
+            top_p: float = 0.9,
+            top_k: int = 50,
+            do_sample: bool = True,
+            stop: Optional[Sequence[StopSequence]] = None,
+            **kwargs: Any
+    ) -> None:
+        """
+        Generates the response to 'messages' and passes on the text of every new token.
+
+        :param messages: A list of { "role": "system"/"user"/"assistant", "content": str }.
+        :param emit: Called with every text delta, on the generating thread.
+        :param cancel: Stops the generation after the current token once set.
+        :param max_new_tokens: Max number of new tokens to generate in the response.
+        :param temperature: Sampling temperature, higher = more random.
+        :param top_p: Nucleus sampling probability cutoff.
+        :param top_k: Top-k filtering cutoff.
+        :param do_sample: Whether or not to sample (True) or do greedy decode (False).
+        :param stop: Stop sequences as in 'generate_response'; no text past a stop is passed on.
+        :param kwargs: Additional parameters to pass to model.generate(); 'seed' as in 'generate_response'.
+        """
+        seed: Optional[int] = kwargs.pop("seed", None)
+        with profiling.span("model.format_prompt"):
+            input_text: str = self.format_prompt(messages, add_generation_prompt=True)
+        with profiling.span("model.tokenize"):
+            inputs = self.tokenizer.encode(input_text, return_tensors="pt").to(self.device)
+
+        criteria = [*kwargs.pop("stopping_criteria", []), CancelCriteria(cancel)]
+        text_filter = None
+        if stop:
+            criteria.append(StopSequenceCriteria(self.tokenizer, inputs.shape[1], stop))
+            text_filter = StopTextFilter(stop, emit)
+            emit = text_filter.feed
+
+        self._generate(
+            inputs,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            streamer=CallbackStreamer(self.tokenizer, emit, skip_special_tokens=True),
+            stopping_criteria=StoppingCriteriaList(criteria),
+            seed=seed,
+            **kwargs
+        )
+        if text_filter is not None:
+            text_filter.flush()
+
+    def _generate(self, inputs: torch.Tensor, seed: Optional[int] = None, **kwargs: Any):
+        """
+        Run model.generate() on tokenized 'inputs', reusing the key/value cache of
+        the longest prompt prefix seen before, so that only the new suffix of the
+        prompt has to be prefilled.
+
+        With prompt-lookup decoding enabled the prefix cache is bypassed, since
+        assisted generation manages and crops its own cache.
+
+        Sampling draws from torch's process-wide random generator, which a 'seed' resets.
+        A seeded generation therefore runs alone among the sampled generations of all
+        models and executor workers, so that it is reproducible; unseeded sampled and
+        greedy generations run side by side.
+        """
+        prefix_cache = self.prefix_cache
+        if self.prompt_lookup_num_tokens:
+            kwargs.setdefault("prompt_lookup_num_tokens", self.prompt_lookup_num_tokens)
+            kwargs.setdefault("max_matching_ngram_size", self.prompt_lookup_max_ngram)
+            prefix_cache = None
+
+        prompt_ids: List[int] = inputs[0].tolist()
+        reused_tokens = 0
+        if prefix_cache is not None:
+            past_key_values, reused_tokens = prefix_cache.lookup(prompt_ids)
+            if past_key_values is not None:
+                kwargs["past_key_values"] = past_key_values
+
+        timer = None
+        if profiling.is_enabled():
+            timer = FirstTokenTimer()
+            kwargs["stopping_criteria"] = StoppingCriteriaList([*kwargs.get("stopping_criteria", []), timer])
+
+        start = time.perf_counter()
+        if not kwargs.get("do_sample"):
+            lock = contextlib.nullcontext()
+        elif seed is not None:
+            lock = SAMPLING_LOCK.exclusive()
+        else:
+            lock = SAMPLING_LOCK.shared()
+        with lock, torch.no_grad():
+            if seed is not None:
+                torch.manual_seed(seed)
+            outputs = self.model.generate(inputs, return_dict_in_generate=True, **kwargs)
+
+        if timer is not None:
+            # The prefill ends with the first new token, everything after it is decoding
+            end = time.perf_counter()
+            first_token = timer.first_token_time or end
+            profiling.record(
+                "model.prefill", start, first_token, prompt_tokens=len(prompt_ids), reused_tokens=reused_tokens
+            )
+            profiling.record("model.decode", first_token, end, new_tokens=outputs.sequences.shape[1] - len(prompt_ids))
+
+        if prefix_cache is not None and outputs.past_key_values is not None:
+            prefix_cache.store(prompt_ids, outputs.past_key_values)
+        return outputs
+
 
 if __name__ == "__main__":
     checkpoint: str = "HuggingFaceTB/SmolLM-135M-Instruct"
@@ -0,0 +1,101 @@
+"""
+Rule-based agents that play perfectly without any inference.
+
+They read the bomb state out of the prompt, rebuild the module it describes and ask
+the module's own rule methods for the right command, so they can never disagree
+with the game. Use them as the zero-inference baseline of load tests and as the
+upper bound of win-rate comparisons:
+
+    await run_two_agents(OracleDefuser(), OracleExpert(), server_url)
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from agents.actions import FALLBACK_ACTION, parse_action
+from agents.models import StaticModel
+from agents.prompts import ADVICE_TITLE, QUESTION_TITLE, STATE_TITLE
+from agents.rules import RuleSolver
+
+
+def _json_sections(prompt: str) -> Optional[Dict[str, str]]:
+    """The sections of a prompt in the 'json' style, None for the text styles."""
+    try:
+        sections = json.loads(prompt)
+    except ValueError:
+        return None
+    return sections if isinstance(sections, dict) else None
+
+
+class OracleModel(StaticModel):
+    """
+    Base of the rule-based agents: answers from the last message of the prompt with
+    the command of agents.rules.
+
+    The Memory module's rules refer to earlier stages, so an instance remembers the
+    presses of the current Memory module. Use one instance per concurrently played game.
+    """
+
+    def __init__(self) -> None:
+        super().__init__("oracle")
+        self.rules = RuleSolver()
+
+    def solve(self, state: str) -> Optional[str]:
+        """
+        The correct command for a state description, None if it cannot be told from it.
+
+        :param state: Text containing the bomb state as the server reports it.
+        """
+        return self.rules.solve(state)
+
+    def answer(self, prompt: str) -> Optional[str]:
+        """The command for the last message of a prompt. Subclasses choose where to look."""
+        return self.solve(prompt)
+
+    def generate_response(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        return self.answer(messages[-1]["content"]) or FALLBACK_ACTION
+
+    def generate_action(self, messages: List[Dict[str, str]], actions: List[str], **kwargs: Any) -> str:
+        command = self.answer(messages[-1]["content"])
+        return command if command in actions else FALLBACK_ACTION
+
+
+class OracleExpert(OracleModel):
+    """Tells the Defuser the correct command for the state it describes."""
+
+    def answer(self, prompt: str) -> Optional[str]:
+        sections = _json_sections(prompt)
+        if sections is not None:
+            return self.solve(sections.get(QUESTION_TITLE, ""))
+        # Only look past the manual excerpt, whose rule texts could resemble a state
+        _, marker, question = prompt.rpartition(QUESTION_TITLE)
+        return self.solve(question if marker else prompt)
+
+
+class OracleDefuser(OracleModel):
+    """
+    Picks the command for the state it sees.
+
+    With 'follow_advice' it plays the command the Expert advised whenever the advice
+    contains one, and only solves the state itself otherwise. That measures an
+    Expert's advice with a Defuser that never misreads it.
+    """
+
+    def __init__(self, follow_advice: bool = False) -> None:
+        """
+        :param follow_advice: Prefer the Expert's advised command over solving the state.
+        """
+        super().__init__()
+        self.follow_advice = follow_advice
+
+    def answer(self, prompt: str) -> Optional[str]:
+        sections = _json_sections(prompt)
+        if sections is not None:
+            state, advice = sections.get(STATE_TITLE, ""), sections.get(ADVICE_TITLE)
+        else:
+            state, marker, advice = prompt.partition(ADVICE_TITLE)
+            advice = advice if marker else None
+        if self.follow_advice and advice:
+            advised = parse_action(advice, default=None)
+            if advised:
+                return advised
+        return self.solve(state)
@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+from transformers import DynamicCache
+
+
+def cache_nbytes(cache: DynamicCache) -> int:
+    """
+    Memory held by the key and value tensors of a cache.
+
+    :param cache: The key/value cache to measure.
+    :return: The size in bytes.
+    """
+    tensors = list(cache.key_cache) + list(cache.value_cache)
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def crop_cache(cache: DynamicCache, length: int, clone: bool = False) -> DynamicCache:
+    """
+    Build a new cache holding the first 'length' positions of 'cache'.
+
+    :param cache: The key/value cache to crop. It is left untouched.
+    :param length: Number of token positions to keep.
+    :param clone: Copy the tensors instead of keeping views into 'cache'.
+    :return: The cropped cache.
+    """
+    layers = []
+    for key, value in zip(cache.key_cache, cache.value_cache):
+        key, value = key[:, :, :length], value[:, :, :length]
+        layers.append((key.clone(), value.clone()) if clone else (key, value))
+    return DynamicCache.from_legacy_cache(tuple(layers))
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    """Number of leading tokens 'a' and 'b' have in common."""
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+class PrefixCache:
+    """
+    LRU store of the key/value caches of previously prefilled prompts.
+
+    Entries are keyed by the prompt's token ids. A lookup returns the cache of the longest
+    prefix the new prompt shares with any stored prompt, so only the remaining suffix
+    has to be prefilled. Least recently used entries are evicted once the stored
+    tensors exceed the memory budget. Lookups and stores may come from several
+    generations at once, e.g. a streamed and an awaited one, and are serialized.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2, min_prefix_tokens: int = 16) -> None:
+        """
+        :param max_bytes: Memory budget for all stored key/value tensors.
+        :param min_prefix_tokens: Shorter shared prefixes are not worth reusing and count as a miss.
+        """
+        self.max_bytes = max_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+        self.entries: "OrderedDict[Tuple[int, ...], Tuple[DynamicCache, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, token_ids: Sequence[int]) -> Tuple[Optional[DynamicCache], int]:
+        """
+        Find the cache of the longest stored prefix of 'token_ids'.
+
+        :param token_ids: Token ids of the prompt about to be generated from.
+        :return: A cache covering the shared prefix, or None on a miss, and the prefix length.
+        """
+        with self._lock:
+            best_key, best_length = None, 0
+            for key in self.entries:
+                length = common_prefix_length(key, token_ids)
+                if length > best_length:
+                    best_key, best_length = key, length
+
+            # At least one prompt token has to be fed to the model to get next-token logits
+            best_length = min(best_length, len(token_ids) - 1)
+            if best_key is None or best_length < self.min_prefix_tokens:
+                self.misses += 1
+                return None, 0
+
+            self.hits += 1
+            self.entries.move_to_end(best_key)
+            # generate() extends caches by concatenation, so views of the stored tensors stay intact
+            return crop_cache(self.entries[best_key][0], best_length), best_length
+
+    def store(self, token_ids: Sequence[int], cache: DynamicCache) -> None:
+        """
+        Remember the prompt part of a cache produced while generating from 'token_ids'.
+
+        :param token_ids: Token ids of the prompt.
+        :param cache: The cache returned by generate(); positions past the prompt are dropped.
+        """
+        key = tuple(token_ids)
+        if len(key) < self.min_prefix_tokens:
+            return
+
+        entry = crop_cache(cache, len(key), clone=True)
+        size = cache_nbytes(entry)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (entry, size)
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self) -> None:
+        """Drop all stored caches."""
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
@@ -1,49 +1,98 @@
-from typing import List, Dict
+import json
+from typing import Callable, List, Dict, Tuple
 
+DEFAULT_SYSTEM_MSG = "You are the responsible and not harmful assistant."
 
-def defuser_prompt(bomb_state: str, expert_advice: str) -> List[Dict[str, str]]:
+# Section titles shared by every prompt style; agents.oracle looks for the last two
+HISTORY_TITLE = "Earlier in this module"
+MANUAL_TITLE = "Manual excerpt"
+QUESTION_TITLE = "DEFUSER sees or asks"
+STATE_TITLE = "Current bomb state"
+ADVICE_TITLE = "Expert's advice"
+
+Sections = List[Tuple[str, str]]
+
+
+def _render_standard(sections: Sections) -> str:
+    return "".join(f"{title}:\n{body}\n\n" for title, body in sections)
+
+
+def _render_markdown(sections: Sections) -> str:
+    return "".join(f"## {title}\n\n{body}\n\n" for title, body in sections)
+
+
+def _render_json(sections: Sections) -> str:
+    return json.dumps(dict(sections), indent=2)
+
+
+# How the sections of a user message are laid out, by style name
+PROMPT_STYLES: Dict[str, Callable[[Sections], str]] = {
+    "standard": _render_standard,
+    "markdown": _render_markdown,
+    "json": _render_json,
+}
+
+
+def _render(sections: Sections, style: str) -> str:
+    if style not in PROMPT_STYLES:
+        raise ValueError(f"Unknown prompt style '{style}', expected one of {sorted(PROMPT_STYLES)}")
+    return PROMPT_STYLES[style](sections)
+
+
+def defuser_prompt(
+        bomb_state: str,
+        expert_advice: str,
+        system_msg: str = DEFAULT_SYSTEM_MSG,
+        history: str = "",
+        style: str = "standard"
+) -> List[Dict[str, str]]:
     """
     Build a 'messages' list for the Defuser LLM.
 
     :param bomb_state: Current bomb state text from the server.
     :param expert_advice: Instructions from the Expert.
+    :param system_msg: The system message of the Defuser.
+    :param history: Earlier turns of the current module, as rendered by ConversationMemory.
+    :param style: Layout of the user message, one of PROMPT_STYLES.
     :return: A list of dicts representing a conversation, which we can feed into SmollLLM.generate_response().
     """
-    system_msg = (
-         "You are the responsible and not harmful assistant."
-    )
-
-    user_content = (
-        f"Current bomb state:\n{bomb_state}\n\n"
-        f"Expert's advice:\n{expert_advice}\n\n"
-    )
+    sections: Sections = []
+    if history:
+        sections.append((HISTORY_TITLE, history))
+    sections += [(STATE_TITLE, bomb_state), (ADVICE_TITLE, expert_advice)]
 
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": system_msg},
-        {"role": "user", "content": user_content}
+        {"role": "user", "content": _render(sections, style)}
     ]
     return messages
 
 
-def expert_prompt(manual_text: str, defuser_question: str) -> List[Dict[str, str]]:
+def expert_prompt(
+        manual_text: str,
+        defuser_question: str,
+        system_msg: str = DEFAULT_SYSTEM_MSG,
+        history: str = "",
+        style: str = "standard"
+) -> List[Dict[str, str]]:
     """
     Build a 'messages' list for the Expert LLM.
 
     :param manual_text: The text from the bomb manual (server).
     :param defuser_question: A description of what the Defuser sees or asks.
+    :param system_msg: The system message of the Expert.
+    :param history: Earlier turns of the current module, as rendered by ConversationMemory.
+           It follows the manual, so that the manual stays a reusable prompt prefix.
+    :param style: Layout of the user message, one of PROMPT_STYLES.
     :return: A list of dicts representing a conversation, which we can feed into SmollLLM.generate_response().
     """
-    system_msg = (
-        "You are the responsible and not harmful assistant."
-    )
-
-    user_content = (
-        f"Manual excerpt:\n{manual_text}\n\n"
-        f"DEFUSER sees or asks:\n{defuser_question}\n\n"
-    )
+    sections: Sections = [(MANUAL_TITLE, manual_text)]
+    if history:
+        sections.append((HISTORY_TITLE, history))
+    sections.append((QUESTION_TITLE, defuser_question))
 
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": system_msg},
-        {"role": "user", "content": user_content}
+        {"role": "user", "content": _render(sections, style)}
     ]
-    return messages
\ No newline at end of file
+    return messages
@@ -0,0 +1,171 @@
+import copy
+import functools
+import threading
+import warnings
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, PreTrainedModel, PreTrainedTokenizer
+
+RegistryKey = Tuple[str, str, str, bool]
+
+# Inference precisions: the dtype weights are loaded in, int8 is quantized after loading
+PRECISIONS: Dict[str, torch.dtype] = {
+    "fp32": torch.float32,
+    "bf16": torch.bfloat16,
+    "int8": torch.float32,
+}
+
+
+# CPU feature flags of native bfloat16 arithmetic: AVX-512 BF16 and AMX on x86, BF16 on Arm
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16", "bf16")
+
+
+@functools.lru_cache(maxsize=None)
+def cpu_flags() -> Optional[FrozenSet[str]]:
+    """The feature flags the kernel reports for the CPU, None where there is no /proc/cpuinfo."""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                # 'flags' on x86, 'Features' on Arm
+                name, _, value = line.partition(":")
+                if name.strip() in ("flags", "Features"):
+                    return frozenset(value.split())
+    except OSError:
+        return None
+    return frozenset()
+
+
+def bf16_supported(device: str) -> bool:
+    """Whether 'device' has native bfloat16 arithmetic, rather than slow emulation."""
+    if device.startswith("cuda"):
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    flags = cpu_flags()
+    if flags is not None:
+        return any(flag in flags for flag in BF16_CPU_FLAGS)
+    # Without /proc/cpuinfo, ask oneDNN whether it has bfloat16 kernels for this CPU
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded checkpoints.
+
+    Each (checkpoint, device, precision, compile) is loaded once and its weights are
+    shared, in eval mode and without gradients, by every HFModel that asks for it.
+    Different keys can load concurrently. Concurrent requests for the same key wait
+    for a single load.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._key_locks: Dict[RegistryKey, threading.Lock] = {}
+        self._entries: Dict[RegistryKey, Tuple[PreTrainedTokenizer, PreTrainedModel]] = {}
+
+    def get(
+            self,
+            checkpoint: str,
+            device: str = "cpu",
+            precision: str = "fp32",
+            compile: bool = False,
+            mmap: bool = False
+    ) -> Tuple[PreTrainedTokenizer, PreTrainedModel]:
+        """
+        Return a tokenizer and the shared model for a checkpoint, loading it on first use.
+
+        :param checkpoint: The model checkpoint name or path (from Hugging Face Hub).
+        :param device: The device on which to load the model ('cpu' or 'cuda').
+        :param precision: 'fp32', 'bf16' (falls back to fp32 where the device lacks native
+               support) or 'int8' (dynamic quantization of the linear layers, CPU only).
+        :param compile: Wrap the model's forward pass in torch.compile.
+        :param mmap: Load the weights from memory-mapped safetensors files without an
+               intermediate full copy in memory. Only used by the first load of a key.
+        :return: A tokenizer for the caller's own use and the shared, read-only model.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}")
+        if precision == "int8" and device != "cpu":
+            raise ValueError("int8 dynamic quantization is only available on CPU")
+        if precision == "bf16" and not bf16_supported(device):
+            warnings.warn(f"{device} has no native bfloat16 support, loading {checkpoint} in fp32")
+            precision = "fp32"
+
+        key = (checkpoint, device, precision, compile)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if key not in self._entries:
+                self._entries[key] = self._load(checkpoint, device, precision, compile, mmap)
+            tokenizer, model = self._entries[key]
+
+        # Fast tokenizers keep mutable padding/truncation state and raise when two threads
+        # change it at once, so every caller gets its own lightweight copy.
+        return copy.deepcopy(tokenizer), model
+
+    def loaded(self) -> Tuple[RegistryKey, ...]:
+        """Keys of all checkpoints loaded so far."""
+        return tuple(self._entries)
+
+    def clear(self) -> None:
+        """Forget all loaded checkpoints. Models still referenced elsewhere stay alive."""
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+    @staticmethod
+    def _load(
+            checkpoint: str,
+            device: str,
+            precision: str,
+            compile: bool,
+            mmap: bool
+    ) -> Tuple[PreTrainedTokenizer, PreTrainedModel]:
+        tokenizer: PreTrainedTokenizer = AutoTokenizer.from_pretrained(checkpoint)
+
+        load_kwargs = {"torch_dtype": PRECISIONS[precision]}
+        if mmap:
+            load_kwargs.update(use_safetensors=True, low_cpu_mem_usage=True)
+
+        model: PreTrainedModel = AutoModelForCausalLM.from_pretrained(checkpoint, **load_kwargs).to(device)
+        model.eval()
+        model.requires_grad_(False)
+
+        if precision == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if compile:
+            model.forward = torch.compile(model.forward, dynamic=True)
+
+        warmup(tokenizer, model, device)
+        return tokenizer, model
+
+
+@functools.lru_cache(maxsize=None)
+def _load_tokenizer(checkpoint: str) -> PreTrainedTokenizer:
+    return AutoTokenizer.from_pretrained(checkpoint)
+
+
+def load_tokenizer(checkpoint: str) -> PreTrainedTokenizer:
+    """
+    The tokenizer of a checkpoint without its model, e.g. to count tokens the way that
+    model would. It is loaded once per process and, as from ModelRegistry.get, every
+    caller gets its own copy.
+    """
+    return copy.deepcopy(_load_tokenizer(checkpoint))
+
+
+def warmup(tokenizer: PreTrainedTokenizer, model: PreTrainedModel, device: str) -> None:
+    """
+    Run a tiny generation so that lazy initialization, quantized kernels and
+    compilation happen at load time instead of during the first game turn.
+    """
+    inputs = tokenizer("Hello", return_tensors="pt").to(device)
+    with torch.no_grad():
+        model.generate(**inputs, max_new_tokens=4, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+
+
+# The registry shared by every model in the process
+registry = ModelRegistry()
@@ -0,0 +1,147 @@
+"""
+Replay recorded games without running any model.
+
+    python -m agents.replay traces.jsonl.gz
+
+Every game is played again on an in-process bomb built from its recorded seed, with
+the recorded generations fed back to the orchestrator in place of the models. Where
+a prompt, parsed action, server response or the outcome differs from the recording,
+the game has diverged, e.g. because the action parsing, prompts or game rules changed.
+"""
+import argparse
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional
+
+from agents.models import StaticModel
+from agents.trace import GameTrace, TurnTrace, read_traces
+from agents.two_agents import run_two_agents
+
+# Fields of a turn compared between recording and replay. The generations themselves
+# are replayed, so they match by construction.
+COMPARED_FIELDS = [f.name for f in fields(TurnTrace) if f.name not in ("expert_output", "defuser_output")]
+
+
+class ReplayExhausted(Exception):
+    """The replayed game asked for more generations than were recorded."""
+
+
+class ReplayModel(StaticModel):
+    """
+    Stands in for a model by returning recorded generations in order, whatever the prompt.
+    """
+
+    def __init__(self, outputs: List[str]) -> None:
+        """
+        :param outputs: The recorded generations of one role, in the order they were made.
+        """
+        super().__init__("replay")
+        self.outputs = deque(outputs)
+
+    def _next(self) -> str:
+        if not self.outputs:
+            raise ReplayExhausted("No recorded generation left")
+        return self.outputs.popleft()
+
+    def generate_response(self, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        return self._next()
+
+    def generate_action(self, messages: List[Dict[str, str]], actions: List[str], **kwargs: Any) -> str:
+        return self._next()
+
+
+@dataclass
+class Divergence:
+    """The first point where a replayed game stopped matching its recording."""
+    game: int
+    # Index of the turn, None for a difference in the outcome only
+    turn: Optional[int]
+    field: str
+    recorded: Any
+    replayed: Any
+
+
+def compare_traces(game: int, recorded: GameTrace, replayed: GameTrace) -> List[Divergence]:
+    """
+    Compare a replay with its recording, up to and including the first turn that differs.
+
+    Later turns would only repeat the consequences of that difference.
+    """
+    for turn, (expected, actual) in enumerate(zip(recorded.turns, replayed.turns)):
+        diverged = [
+            Divergence(game, turn, name, getattr(expected, name), getattr(actual, name))
+            for name in COMPARED_FIELDS
+            if getattr(expected, name) != getattr(actual, name)
+        ]
+        if diverged:
+            return diverged
+
+    if len(recorded.turns) != len(replayed.turns):
+        turn = min(len(recorded.turns), len(replayed.turns))
+        return [Divergence(game, turn, "turns", len(recorded.turns), len(replayed.turns))]
+    if recorded.result != replayed.result:
+        return [Divergence(game, None, "result", recorded.result, replayed.result)]
+    return []
+
+
+async def replay_game(game: int, recorded: GameTrace) -> List[Divergence]:
+    """
+    Play a recorded game again with its recorded generations.
+
+    :param game: Index of the game, for reporting.
+    :param recorded: The recorded game.
+    :return: Where the replay diverges from the recording, empty if it does not.
+    """
+    replayed = GameTrace(seed=recorded.seed)
+    try:
+        await run_two_agents(
+            ReplayModel([turn.defuser_output for turn in recorded.turns]),
+            ReplayModel([turn.expert_output for turn in recorded.turns]),
+            seed=recorded.seed,
+            local=True,
+            trace=replayed,
+            verbose=False,
+            **recorded.settings
+        )
+    except ReplayExhausted:
+        # The replay outlived the recording; the extra turn is compared as a turn count
+        pass
+    return compare_traces(game, recorded, replayed)
+
+
+async def replay_file(path: str) -> Dict[str, Any]:
+    """
+    Replay every game of a trace file.
+
+    :return: The number of games and of diverged games, the seconds it took and all divergences.
+    """
+    start = time.perf_counter()
+    games = 0
+    divergences: List[Divergence] = []
+    for game, recorded in enumerate(read_traces(path)):
+        divergences.extend(await replay_game(game, recorded))
+        games += 1
+    return {
+        "games": games,
+        "diverged_games": len({d.game for d in divergences}),
+        "seconds": time.perf_counter() - start,
+        "divergences": divergences,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded games and report where they diverge")
+    parser.add_argument("traces", help="Trace file written by run_two_agents(trace=...) or the tournament")
+    parser.add_argument("--show", type=int, default=10, help="Print at most this many divergences")
+    args = parser.parse_args()
+
+    summary = asyncio.run(replay_file(args.traces))
+    print(f"Replayed {summary['games']} games in {summary['seconds']:.2f}s, "
+          f"{summary['diverged_games']} diverged")
+    for divergence in summary["divergences"][:args.show]:
+        where = "outcome" if divergence.turn is None else f"turn {divergence.turn}"
+        print(f"\n[game {divergence.game}, {where}, {divergence.field}]")
+        print(f"  recorded: {divergence.recorded!r}")
+        print(f"  replayed: {divergence.replayed!r}")
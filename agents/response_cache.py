@@ -0,0 +1,126 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def _encode_pattern(value: Any) -> Dict[str, Any]:
+    """JSON form of a compiled stop pattern; everything else that is not JSON is refused."""
+    if isinstance(value, re.Pattern):
+        return {"pattern": value.pattern, "flags": value.flags}
+    raise TypeError(f"{type(value).__name__} is not part of a cache key")
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of deterministic generations.
+
+    Keys hash the model fingerprint (checkpoint, revision, precision, ...), the prompt
+    messages and every generation parameter, so changing any of them simply misses.
+    Lookups go to an in-memory LRU tier first and then to an optional SQLite file that
+    persists across runs.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 4096) -> None:
+        """
+        :param path: SQLite file of the persistent tier, None to keep the cache in memory only.
+        :param max_memory_entries: Size of the in-memory LRU tier.
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.memory: "OrderedDict[str, str]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(
+            fingerprint: Dict[str, Any],
+            method: str,
+            messages: List[Dict[str, str]],
+            params: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        Hash everything that determines a generation's output.
+
+        Parameters must be JSON values or compiled stop patterns. Any other object, such
+        as a streamer or logits processor, could change the output without changing its
+        representation, so such a call gets no key.
+
+        :param fingerprint: Identity of the model and its inference configuration.
+        :param method: The generation method, e.g. 'generate_response'.
+        :param messages: The prompt messages.
+        :param params: All generation parameters.
+        :return: The hex digest used as cache key, or None if the call must not be cached.
+        """
+        try:
+            payload = json.dumps([fingerprint, method, messages, params], sort_keys=True, default=_encode_pattern)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for 'key', or None on a miss."""
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._remember(key, row[0])
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response in both tiers."""
+        with self._lock:
+            self._remember(key, response)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?)", (key, response))
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counts of both tiers and the overall hit rate."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        """Drop every entry of both tiers."""
+        with self._lock:
+            self.memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self) -> None:
+        """Close the SQLite file. The in-memory tier stays usable."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, response: str) -> None:
+        self.memory[key] = response
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
@@ -0,0 +1,146 @@
+"""
+The rules of the game applied to state descriptions, without any model.
+
+A state is read back from the text the server reports, the module it describes is
+rebuilt, and the module's own rule methods name the correct command. Only the game
+package is needed, so the rules can be used where torch is not installed, e.g. by
+the fake LLM server of crewai_bomb.
+"""
+import re
+from typing import Any, Callable, Dict, Optional
+
+from game.modules.button_module import ButtonModule
+from game.modules.memory_module import MemoryModule
+from game.modules.module import Module
+from game.modules.regular_wires_module import RegularWiresModule
+from game.modules.simon_says_module import SimonSaysModule
+
+MODULE_HEADER = re.compile(r"^Module \d+/\d+: (\w+)", re.MULTILINE)
+SERIAL_NUMBER = re.compile(r"^Serial number: (\w+)", re.MULTILINE)
+WIRE = re.compile(r"^Wire \d+: (\w+)", re.MULTILINE)
+BUTTON = re.compile(r"^Button: (\w+) button labeled '(\w+)'", re.MULTILINE)
+BATTERIES = re.compile(r"^Batteries: (\d+)", re.MULTILINE)
+LIT_INDICATORS = re.compile(r"^Lit indicators: (.+)$", re.MULTILINE)
+HOLDING = re.compile(r"^You are holding the button\. A (\w+) colored strip", re.MULTILINE)
+FLASHING = re.compile(r"^Flashing sequence: (.+)$", re.MULTILINE)
+SIMON_INPUTS = re.compile(r"^Your inputs so far: (.+)$", re.MULTILINE)
+MEMORY_STAGE = re.compile(r"^Stage (\d)/\d", re.MULTILINE)
+MEMORY_DISPLAY = re.compile(r"^Display shows: (\d)", re.MULTILINE)
+MEMORY_BUTTON = re.compile(r"^Position (\d): Button labeled (\d)", re.MULTILINE)
+
+
+def _rebuild(cls: type, **attributes: Any) -> Module:
+    """An instance of a module class with the given attributes and no random layout of its own."""
+    module = cls.__new__(cls)
+    Module.__init__(module)
+    module.__dict__.update(attributes)
+    return module
+
+
+def _solve_wires(state: str, memory: Dict[int, Dict[str, int]]) -> Optional[str]:
+    serial, colors = SERIAL_NUMBER.search(state), WIRE.findall(state)
+    if not serial or not colors:
+        return None
+    module = _rebuild(RegularWiresModule, serial_number=serial.group(1), wire_colors=colors)
+    wire = next((i for i in range(1, len(colors) + 1) if module._is_correct_wire(i)), None)
+    return f"cut wire {wire}" if wire else None
+
+
+def _solve_button(state: str, memory: Dict[int, Dict[str, int]]) -> Optional[str]:
+    button, batteries = BUTTON.search(state), BATTERIES.search(state)
+    if not button or not batteries:
+        return None
+    lit = LIT_INDICATORS.search(state)
+    holding = HOLDING.search(state)
+    module = _rebuild(
+        ButtonModule,
+        button_color=button.group(1),
+        button_label=button.group(2),
+        batteries=int(batteries.group(1)),
+        lit_indicators=lit.group(1).split(", ") if lit else [],
+        is_holding=bool(holding),
+        strip_color=holding.group(1) if holding else None
+    )
+    if holding:
+        return f"release on {module._get_correct_release_digit()}"
+    return "press" if module._should_press() else "hold"
+
+
+def _solve_simon(state: str, memory: Dict[int, Dict[str, int]]) -> Optional[str]:
+    serial, flashing = SERIAL_NUMBER.search(state), FLASHING.search(state)
+    if not serial or not flashing:
+        return None
+    inputs = SIMON_INPUTS.search(state)
+    index = len(inputs.group(1).split(", ")) if inputs else 0
+    sequence = flashing.group(1).split(", ")
+    if index >= len(sequence):
+        return None
+    module = _rebuild(
+        SimonSaysModule,
+        serial_number=serial.group(1),
+        has_vowel=any(c in "aeiou" for c in serial.group(1).lower())
+    )
+    return f"press {module.get_color_mapping(sequence[index], index)}"
+
+
+def _solve_memory(state: str, memory: Dict[int, Dict[str, int]]) -> Optional[str]:
+    stage, display = MEMORY_STAGE.search(state), MEMORY_DISPLAY.search(state)
+    labels = {int(position): int(label) for position, label in MEMORY_BUTTON.findall(state)}
+    if not stage or not display or len(labels) != 4:
+        return None
+    current_stage = int(stage.group(1))
+    if current_stage == 1:
+        # A new Memory module: forget the presses of an earlier game
+        memory.clear()
+
+    module = _rebuild(
+        MemoryModule,
+        current_stage=current_stage,
+        display_number=int(display.group(1)),
+        button_labels=[labels[position] for position in range(1, 5)],
+        stage_history=memory
+    )
+    try:
+        position = next((p for p in range(1, 5) if module._is_correct_position(p)), None)
+    except KeyError:
+        # The rule refers to a stage this agent has not seen
+        return None
+    if position is None:
+        return None
+    memory[current_stage] = {"position": position, "label": labels[position]}
+    return f"press position {position}"
+
+
+# Per module id: the solver of a state description of that module
+SOLVERS: Dict[str, Callable[[str, Dict[int, Dict[str, int]]], Optional[str]]] = {
+    "RegularWiresModule": _solve_wires,
+    "ButtonModule": _solve_button,
+    "SimonSaysModule": _solve_simon,
+    "MemoryModule": _solve_memory,
+}
+
+
+class RuleSolver:
+    """
+    Names the correct command for state descriptions.
+
+    The Memory module's rules refer to earlier stages, so a solver remembers the
+    presses of the current Memory module. Use one solver per concurrently played game.
+    """
+
+    def __init__(self) -> None:
+        self.memory_history: Dict[int, Dict[str, int]] = {}
+
+    def solve(self, state: str) -> Optional[str]:
+        """
+        The correct command for a state description, None if it cannot be told from it.
+
+        :param state: Text containing the bomb state as the server reports it.
+        """
+        header = MODULE_HEADER.search(state)
+        solvers = [SOLVERS[header.group(1)]] if header and header.group(1) in SOLVERS else SOLVERS.values()
+        for solver in solvers:
+            command = solver(state, self.memory_history)
+            if command is not None:
+                return command
+        return None
@@ -0,0 +1,290 @@
+"""
+Search generation parameters and prompt styles for the best-playing configuration,
+spending games only where they still tell configurations apart.
+
+    python -m agents.sweep --space space.json --configs 16 --min-games 4 --db sweep.sqlite
+
+The search space is a JSON object of parameter name to candidate values, e.g.
+
+    {"temperature": [0.2, 0.7, 1.0], "top_p": [0.8, 0.95], "top_k": [20, 50],
+     "max_new_tokens": [30, 50], "prompt_style": ["standard", "markdown", "json"]}
+
+Candidates are drawn from its grid and compared by successive halving: every
+candidate plays 'min_games' games, the best 1/eta of them play eta times as many,
+and so on until one is left. Weak candidates are dropped after a few games, so most
+of the inference budget goes to the ones that are hard to tell apart. All candidates
+play the same seeded bombs with seeded sampling, and one pair of models with its
+prefix and response caches serves all of them.
+
+Every game is a row of the 'games' table of the SQLite database:
+
+    sqlite3 sweep.sqlite "SELECT config, AVG(disarmed), COUNT(*) FROM games GROUP BY config"
+
+A sweep started again under the same name only plays the games missing from it.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sqlite3
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from agents.models import HFModel, SmollLLM
+from agents.response_cache import ResponseCache
+from agents.two_agents import run_two_agents
+
+# Parameters passed to the models' generate methods
+SAMPLING_PARAMS = ("temperature", "top_p", "top_k", "do_sample")
+# Parameters passed to run_two_agents as they are
+GAME_PARAMS = ("max_new_tokens", "prompt_style", "memory_tokens", "constrain_actions", "retrieve_sections")
+
+DEFAULT_SPACE: Dict[str, List[Any]] = {
+    "temperature": [0.2, 0.7, 1.0],
+    "top_p": [0.8, 0.95],
+    "top_k": [20, 50],
+    "max_new_tokens": [30, 50],
+    "prompt_style": ["standard", "markdown", "json"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    sweep TEXT NOT NULL,
+    config TEXT NOT NULL,
+    params TEXT NOT NULL,
+    game INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    rung INTEGER NOT NULL,
+    disarmed INTEGER NOT NULL,
+    exploded INTEGER NOT NULL,
+    turns INTEGER NOT NULL,
+    modules_solved INTEGER NOT NULL,
+    failed_module TEXT,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (sweep, config, game)
+)
+"""
+
+
+def config_name(params: Dict[str, Any]) -> str:
+    """A stable, readable name of a candidate, e.g. 'max_new_tokens=30,temperature=0.2'."""
+    return ",".join(f"{key}={params[key]}" for key in sorted(params))
+
+
+def sample_configs(space: Dict[str, List[Any]], count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Candidates from the grid of a search space.
+
+    :param space: Candidate values per parameter.
+    :param count: How many candidates to draw; the whole grid if it is not larger.
+    :param seed: Seed of the draw, so that a resumed sweep draws the same candidates.
+    """
+    unknown = set(space) - set(SAMPLING_PARAMS) - set(GAME_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown parameters {sorted(unknown)}, expected some of {SAMPLING_PARAMS + GAME_PARAMS}")
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    if len(grid) <= count:
+        return grid
+    return random.Random(seed).sample(grid, count)
+
+
+def open_results(path: str) -> sqlite3.Connection:
+    """The results database at 'path', created if it does not exist yet."""
+    connection = sqlite3.connect(path)
+    connection.execute(SCHEMA)
+    connection.commit()
+    return connection
+
+
+def _played(connection: sqlite3.Connection, sweep: str, config: str) -> Set[int]:
+    rows = connection.execute("SELECT game FROM games WHERE sweep = ? AND config = ?", (sweep, config))
+    return {game for game, in rows}
+
+
+def _score(connection: sqlite3.Connection, sweep: str, config: str, games: int) -> Tuple[float, float, float]:
+    # Win rate first, then progress on the bomb, then the fewest turns
+    win_rate, modules_solved, turns = connection.execute(
+        "SELECT AVG(disarmed), AVG(modules_solved), AVG(turns) FROM games "
+        "WHERE sweep = ? AND config = ? AND game < ?",
+        (sweep, config, games)
+    ).fetchone()
+    return win_rate or 0.0, modules_solved or 0.0, -(turns or 0.0)
+
+
+async def play(
+        defuser_model: HFModel,
+        expert_model: HFModel,
+        params: Dict[str, Any],
+        seed: int,
+        server_url: Optional[str] = None,
+        max_turns: Optional[int] = 50
+) -> Dict[str, Any]:
+    """
+    Play one game of a candidate on the bomb of 'seed', sampling with the same seed.
+
+    :param server_url: The URL of the bomb-defusal server, None to play in-process.
+    :return: The GameResult fields and the seconds the game took.
+    """
+    sampling = {key: params[key] for key in SAMPLING_PARAMS if key in params}
+    sampling["seed"] = seed
+    where = {"server_url": server_url} if server_url else {"local": True}
+    start = time.perf_counter()
+    result = await run_two_agents(
+        defuser_model,
+        expert_model,
+        max_turns=max_turns,
+        sampling=sampling,
+        seed=seed,
+        verbose=False,
+        **where,
+        **{key: params[key] for key in GAME_PARAMS if key in params}
+    )
+    return {**asdict(result), "seconds": time.perf_counter() - start}
+
+
+def leaderboard(connection: sqlite3.Connection, sweep: str) -> List[Dict[str, Any]]:
+    """Every candidate of a sweep with its games, win rate and means, the most played and winning first."""
+    rows = connection.execute(
+        "SELECT config, params, COUNT(*), AVG(disarmed), AVG(exploded), AVG(modules_solved), "
+        "AVG(turns), AVG(seconds) FROM games WHERE sweep = ? "
+        "GROUP BY config ORDER BY COUNT(*) DESC, AVG(disarmed) DESC, AVG(modules_solved) DESC",
+        (sweep,)
+    )
+    keys = ["config", "params", "games", "win_rate", "explosion_rate", "mean_modules_solved",
+            "mean_turns", "mean_game_seconds"]
+    board = [dict(zip(keys, row)) for row in rows]
+    for entry in board:
+        entry["params"] = json.loads(entry["params"])
+    return board
+
+
+async def run_sweep(
+        defuser_model: HFModel,
+        expert_model: HFModel,
+        configs: List[Dict[str, Any]],
+        db_path: str,
+        sweep: str = "sweep",
+        min_games: int = 4,
+        eta: int = 2,
+        max_games: Optional[int] = None,
+        seed: int = 0,
+        server_url: Optional[str] = None,
+        max_turns: Optional[int] = 50,
+        log: Callable[..., None] = print
+) -> Dict[str, Any]:
+    """
+    Successive halving over candidate configurations.
+
+    :param defuser_model: The Defuser of every candidate.
+    :param expert_model: The Expert of every candidate.
+    :param configs: The candidates, e.g. from 'sample_configs'.
+    :param db_path: SQLite database the games are written to and resumed from.
+    :param sweep: Name of the sweep within the database.
+    :param min_games: Games every candidate plays in the first rung.
+    :param eta: Each rung keeps the best 1/eta of the candidates and plays eta times as many games.
+    :param max_games: Stop growing the games per candidate at this many and end the sweep there.
+    :param seed: The bomb of game i is built from seed + i.
+    :param server_url: The URL of the bomb-defusal server, None to play in-process.
+    :param max_turns: Give up a game after this many actions.
+    :param log: Receives a line per finished rung.
+    :return: The best candidate, the leaderboard, the games played and, as
+             'games_without_halving', how many games playing every candidate as
+             often as the best would have taken.
+    """
+    if not configs:
+        raise ValueError("The sweep needs at least one candidate")
+    if eta < 2:
+        raise ValueError("eta must be at least 2")
+    if min_games < 1:
+        raise ValueError("min_games must be at least 1")
+    if max_games is not None and max_games < min_games:
+        raise ValueError("max_games must not be less than min_games")
+
+    connection = open_results(db_path)
+    names = {config_name(params): params for params in configs}
+    survivors = list(names)
+    games, rung, played = min_games, 0, 0
+    start = time.perf_counter()
+    try:
+        while True:
+            for name in survivors:
+                done = _played(connection, sweep, name)
+                for game in range(games):
+                    if game in done:
+                        continue
+                    row = await play(defuser_model, expert_model, names[name], seed + game, server_url, max_turns)
+                    connection.execute(
+                        "INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (sweep, name, json.dumps(names[name]), game, seed + game, rung, row["disarmed"],
+                         row["exploded"], row["turns"], row["modules_solved"], row["failed_module"], row["seconds"])
+                    )
+                    connection.commit()
+                    played += 1
+
+            survivors.sort(key=lambda name: _score(connection, sweep, name, games), reverse=True)
+            log(f"Rung {rung}: {len(survivors)} candidates x {games} games, best {survivors[0]} "
+                f"with win rate {_score(connection, sweep, survivors[0], games)[0]:.2f}")
+            if len(survivors) == 1 or games == max_games:
+                break
+            survivors = survivors[:max(1, len(survivors) // eta)]
+            if len(survivors) == 1:
+                break
+            games = games * eta if max_games is None else min(games * eta, max_games)
+            rung += 1
+
+        return {
+            "best": names[survivors[0]],
+            "best_config": survivors[0],
+            "leaderboard": leaderboard(connection, sweep),
+            "games_played": played,
+            "wall_seconds": time.perf_counter() - start,
+            "games_without_halving": len(names) * games,
+        }
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving sweep over generation parameters and prompt styles")
+    parser.add_argument("--space", default=None, help="JSON object of parameter name to candidate values")
+    parser.add_argument("--configs", type=int, default=16, help="Candidates drawn from the grid of the space")
+    parser.add_argument("--min-games", type=int, default=4, help="Games per candidate in the first rung")
+    parser.add_argument("--eta", type=int, default=2, help="Keep the best 1/eta of the candidates per rung")
+    parser.add_argument("--max-games", type=int, default=None, help="Most games a candidate plays")
+    parser.add_argument("--db", default="sweep.sqlite", help="SQLite database of per-game results")
+    parser.add_argument("--name", default="sweep", help="Name of the sweep within the database")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the candidate draw and the first bomb")
+    parser.add_argument("--checkpoint", default="HuggingFaceTB/SmolLM-135M-Instruct")
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--response-cache", default=None, help="SQLite file persisting generations across sweeps")
+    parser.add_argument("--server-url", default=None, help="Play on this server instead of in-process")
+    args = parser.parse_args()
+    if args.max_games is not None and args.max_games < args.min_games:
+        parser.error("--max-games must not be less than --min-games")
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+
+    # One cache for both roles and all candidates
+    cache = ResponseCache(args.response_cache)
+    model_kwargs = dict(device=args.device, precision=args.precision, response_cache=cache)
+    summary = asyncio.run(run_sweep(
+        SmollLLM(args.checkpoint, **model_kwargs),
+        SmollLLM(args.checkpoint, **model_kwargs),
+        sample_configs(space, args.configs, args.seed),
+        args.db,
+        sweep=args.name,
+        min_games=args.min_games,
+        eta=args.eta,
+        max_games=args.max_games,
+        seed=args.seed,
+        server_url=args.server_url
+    ))
+    print(json.dumps({key: value for key, value in summary.items() if key != "leaderboard"}, indent=2))
+    print(f"Response cache: {cache.stats()}")
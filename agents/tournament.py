@@ -0,0 +1,267 @@
+"""
+Play many two-agent games per configuration, in parallel, and summarize them.
+
+    python -m agents.tournament --configs configs.json --games 200 --workers 4 --results runs/results.jsonl
+
+The configs file is a JSON list of MatchConfig fields, e.g.
+
+    [{"name": "baseline"},
+     {"name": "greedy", "sampling": {"do_sample": false, "temperature": null, "top_p": null, "top_k": null}},
+     {"name": "oracle-expert", "expert_checkpoint": "oracle"}]
+
+A checkpoint of "oracle" plays that role with the rule-based agents of agents.oracle.
+
+Each finished game is appended to the results file as one JSON line, so an
+interrupted run started again with the same arguments only plays the missing games.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import IO, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from agents.models import HFModel, SmollLLM
+from agents.oracle import OracleDefuser, OracleExpert
+from agents.prompts import DEFAULT_SYSTEM_MSG
+from agents.trace import GameTrace, write_traces
+from agents.two_agents import run_two_agents
+
+DEFAULT_CHECKPOINT = "HuggingFaceTB/SmolLM-135M-Instruct"
+# Checkpoint name that selects the rule-based agent of a role instead of a model
+ORACLE = "oracle"
+
+
+@dataclass
+class MatchConfig:
+    """A model pair, its prompts and generation settings."""
+    name: str
+    defuser_checkpoint: str = DEFAULT_CHECKPOINT
+    expert_checkpoint: str = DEFAULT_CHECKPOINT
+    precision: str = "fp32"
+    max_new_tokens: int = 50
+    sampling: Dict[str, Any] = field(default_factory=dict)
+    defuser_system: str = DEFAULT_SYSTEM_MSG
+    expert_system: str = DEFAULT_SYSTEM_MSG
+    constrain_actions: bool = True
+    retrieve_sections: bool = True
+    memory_tokens: int = 256
+    prompt_style: str = "standard"
+    max_turns: Optional[int] = 50
+
+
+# Models of the current worker process by (checkpoint, precision)
+_models: Dict[Tuple[str, str], HFModel] = {}
+_device = "cpu"
+
+
+def _init_worker(configs: List[MatchConfig], device: str) -> None:
+    """Load every checkpoint the configs need once, when the worker process starts."""
+    global _device
+    _device = device
+    for config in configs:
+        _model(config.defuser_checkpoint, config.precision)
+        _model(config.expert_checkpoint, config.precision)
+
+
+def _model(checkpoint: str, precision: str, role: str = "") -> HFModel:
+    if checkpoint == ORACLE:
+        # Oracles are free to create and remember their game's Memory presses
+        return OracleDefuser() if role == "defuser" else OracleExpert()
+    key = (checkpoint, precision)
+    if key not in _models:
+        _models[key] = SmollLLM(checkpoint, device=_device, precision=precision)
+    return _models[key]
+
+
+def play_game(
+        config: MatchConfig,
+        game: int,
+        server_url: str,
+        record: bool = False,
+        seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Play one game of 'config' on a bomb of its own.
+
+    :param record: Also return the game's trace under 'trace'.
+    :param seed: Seed of the tournament; the game plays the bomb of 'seed + game'. None for a random bomb.
+    :return: The result row written to the results file.
+    """
+    trace = GameTrace(seed=0) if record else None
+    start = time.perf_counter()
+    result = asyncio.run(run_two_agents(
+        _model(config.defuser_checkpoint, config.precision, "defuser"),
+        _model(config.expert_checkpoint, config.precision, "expert"),
+        server_url,
+        max_new_tokens=config.max_new_tokens,
+        constrain_actions=config.constrain_actions,
+        retrieve_sections=config.retrieve_sections,
+        max_turns=config.max_turns,
+        sampling=config.sampling,
+        defuser_system=config.defuser_system,
+        expert_system=config.expert_system,
+        memory_tokens=config.memory_tokens,
+        prompt_style=config.prompt_style,
+        seed=None if seed is None else seed + game,
+        trace=trace,
+        verbose=False
+    ))
+    row = {"config": config.name, "game": game, "seconds": time.perf_counter() - start, **asdict(result)}
+    if trace is not None:
+        row["trace"] = trace
+    return row
+
+
+def read_results(path: str) -> List[Dict[str, Any]]:
+    """Rows of a results file, skipping a last line cut off by an interrupted run."""
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path) as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return rows
+
+
+def open_results(path: str) -> IO[str]:
+    """
+    Open a results file for appending. A last line cut off by an interrupted run is
+    ended first, so that it does not swallow the first new row.
+    """
+    results = open(path, "a")
+    if results.tell() > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                results.write("\n")
+    return results
+
+
+def summarize(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate result rows per config.
+
+    :return: Per config: games, win and explosion rates, mean turns of disarmed games,
+             mean modules solved and, per module id, the fraction of games lost on it.
+    """
+    by_config: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_config.setdefault(row["config"], []).append(row)
+
+    summary = {}
+    for name, games in by_config.items():
+        wins = [g for g in games if g["disarmed"]]
+        failures = Counter(g["failed_module"] for g in games if g["failed_module"])
+        summary[name] = {
+            "games": len(games),
+            "win_rate": len(wins) / len(games),
+            "explosion_rate": sum(g["exploded"] for g in games) / len(games),
+            "mean_turns_to_disarm": sum(g["turns"] for g in wins) / len(wins) if wins else None,
+            "mean_modules_solved": sum(g["modules_solved"] for g in games) / len(games),
+            "module_failure_rates": {module: count / len(games) for module, count in failures.items()},
+            "mean_game_seconds": sum(g["seconds"] for g in games) / len(games),
+        }
+    return summary
+
+
+def run_tournament(
+        configs: List[MatchConfig],
+        games: int,
+        results_path: str,
+        server_url: str = "http://0.0.0.0:8080",
+        workers: int = 1,
+        device: str = "cpu",
+        traces_path: Optional[str] = None,
+        seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Play 'games' games per config on a pool of worker processes, appending every
+    finished game to 'results_path'. Games already in the file are not played again.
+
+    :param configs: The configurations to compare; their names must be unique.
+    :param games: Games per config.
+    :param results_path: JSON lines file of per-game results.
+    :param server_url: The URL where the bomb-defusal server is running.
+    :param workers: Number of processes, each with its own copy of the models.
+    :param device: The device the workers load the models on.
+    :param traces_path: Also append the trace of every game to this file, for 'agents.replay'.
+    :param seed: Game n of every config plays the bomb of 'seed + n', so all configs face the same
+           bombs. None gives every game a random bomb.
+    :return: The summary of all results in the file, plus the throughput of this run.
+    """
+    names = [config.name for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("Config names must be unique")
+
+    done: Set[Tuple[str, int]] = {(row["config"], row["game"]) for row in read_results(results_path)}
+    pending = [(config, game) for config in configs for game in range(games) if (config.name, game) not in done]
+
+    start = time.perf_counter()
+    if pending:
+        os.makedirs(os.path.dirname(results_path) or ".", exist_ok=True)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(configs, device)) as pool, \
+                open_results(results_path) as results:
+            futures = [
+                pool.submit(play_game, config, game, server_url, traces_path is not None, seed)
+                for config, game in pending
+            ]
+            for future in as_completed(futures):
+                row = future.result()
+                if traces_path is not None:
+                    write_traces(traces_path, [row.pop("trace")])
+                results.write(json.dumps(row) + "\n")
+                results.flush()
+    seconds = time.perf_counter() - start
+
+    return {
+        "configs": summarize(read_results(results_path)),
+        "games_played": len(pending),
+        "wall_seconds": seconds,
+        "games_per_minute": 60 * len(pending) / seconds if pending else None,
+    }
+
+
+def load_configs(path: Optional[str]) -> List[MatchConfig]:
+    """Configs from a JSON list of MatchConfig fields, or the default config without a file."""
+    if path is None:
+        return [MatchConfig(name="default")]
+    with open(path) as f:
+        return [MatchConfig(**fields) for fields in json.load(f)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play two-agent games per config in parallel")
+    parser.add_argument("--configs", default=None, help="JSON list of MatchConfig fields")
+    parser.add_argument("--games", type=int, default=100, help="Games per config")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each holding its own models")
+    parser.add_argument("--results", default="tournament.jsonl", help="Per-game results, appended to and resumed from")
+    parser.add_argument("--summary", default=None, help="Also write the summary to this JSON file")
+    parser.add_argument("--traces", default=None, help="Record every game to this trace file (.gz to compress)")
+    parser.add_argument("--seed", type=int, default=None, help="Game n of every config plays the bomb of seed + n")
+    parser.add_argument("--server-url", default="http://0.0.0.0:8080")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    summary = run_tournament(
+        load_configs(args.configs),
+        args.games,
+        args.results,
+        server_url=args.server_url,
+        workers=args.workers,
+        device=args.device,
+        traces_path=args.traces,
+        seed=args.seed
+    )
+    print(json.dumps(summary, indent=2))
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
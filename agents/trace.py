@@ -0,0 +1,68 @@
+import gzip
+import json
+from dataclasses import asdict, dataclass, field
+from typing import IO, Any, Dict, Iterable, Iterator, List
+
+Messages = List[Dict[str, str]]
+
+
+@dataclass
+class TurnTrace:
+    """Everything that was seen, generated and answered in one turn of a game."""
+    state: str
+    manual: str
+    expert_messages: Messages
+    expert_output: str
+    defuser_messages: Messages
+    # The Defuser's raw generation: the constrained action, or the streamed text it was parsed from
+    defuser_output: str
+    action: str
+    response: str
+
+
+@dataclass
+class GameTrace:
+    """
+    A recorded two-agent game. Together with the seed of its bomb, the recorded
+    generations are enough to play the game again without running any model.
+    """
+    seed: int
+    # The run_two_agents options the game was played with
+    settings: Dict[str, Any] = field(default_factory=dict)
+    turns: List[TurnTrace] = field(default_factory=list)
+    # The GameResult fields, filled in when the game ends
+    result: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GameTrace":
+        return cls(
+            seed=data["seed"],
+            settings=data.get("settings", {}),
+            turns=[TurnTrace(**turn) for turn in data.get("turns", [])],
+            result=data.get("result", {})
+        )
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    # Manuals and prompts repeat from turn to turn, so gzip shrinks traces considerably
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_traces(path: str, traces: Iterable[GameTrace]) -> None:
+    """Append traces to a JSON lines file, gzip-compressed if 'path' ends with '.gz'."""
+    with _open(path, "a") as f:
+        for trace in traces:
+            f.write(json.dumps(trace.to_dict()) + "\n")
+
+
+def read_traces(path: str) -> Iterator[GameTrace]:
+    """Iterate over the traces of a file written by 'write_traces'."""
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield GameTrace.from_dict(json.loads(line))
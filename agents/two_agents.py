@@ -1,16 +1,59 @@
 import asyncio
+import contextlib
+import os
+import random
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
 
-from agents.prompts import expert_prompt, defuser_prompt
+from agents.actions import IncrementalActionParser, parse_legal_actions
+from agents.manual_index import relevant_manual
+from agents.memory import ConversationMemory
+from agents.prompts import DEFAULT_SYSTEM_MSG, expert_prompt, defuser_prompt
+from agents.trace import GameTrace, TurnTrace
+from game_mcp import profiling
 from game_mcp.game_client import Defuser, Expert
+from game_mcp.local_client import LocalDefuser, LocalExpert, LocalGame
 from agents.models import HFModel, SmollLLM
+from agents.registry import load_tokenizer
+
+
+@dataclass
+class GameResult:
+    """Outcome of one two-agent game."""
+    disarmed: bool
+    exploded: bool
+    turns: int
+    modules_solved: int
+    # Module id of the module the bomb exploded on, if it did
+    failed_module: Optional[str] = None
+    # Per profiling phase: span count and total seconds, empty unless profiling is enabled
+    phases: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+
+# Sampling parameters of both agents unless overridden
+DEFAULT_SAMPLING: Dict[str, Any] = {"temperature": 0.7, "top_p": 0.9, "top_k": 50, "do_sample": True}
 
 
 async def run_two_agents(
         defuser_model: HFModel,
         expert_model: HFModel,
         server_url: str = "http://0.0.0.0:8080",
-        max_new_tokens: int = 50
-) -> None:
+        max_new_tokens: int = 50,
+        constrain_actions: bool = True,
+        retrieve_sections: bool = True,
+        max_turns: Optional[int] = None,
+        sampling: Optional[Dict[str, Any]] = None,
+        defuser_system: str = DEFAULT_SYSTEM_MSG,
+        expert_system: str = DEFAULT_SYSTEM_MSG,
+        memory_tokens: int = 256,
+        memory_tokenizer: Optional[str] = None,
+        prompt_style: str = "standard",
+        seed: Optional[int] = None,
+        local: bool = False,
+        trace: Optional[GameTrace] = None,
+        verbose: bool = True
+) -> GameResult:
     """
     Main coroutine that orchestrates two LLM agents (Defuser and Expert)
     interacting with the bomb-defusal server.
@@ -19,76 +62,184 @@ async def run_two_agents(
     :param expert_model: The HFModel for the Expert's role.
     :param server_url: The URL where the bomb-defusal server is running.
     :param max_new_tokens: Max tokens to generate for each LLM response.
+    :param constrain_actions: Restrict the Defuser's output to the legal commands of the current state.
+    :param retrieve_sections: Give the Expert only the manual section that applies to the current state.
+    :param max_turns: Give up after this many actions, None to play until the bomb is disarmed or explodes.
+    :param sampling: Generation parameters of both agents, merged over DEFAULT_SAMPLING.
+    :param defuser_system: System message of the Defuser's prompt.
+    :param expert_system: System message of the Expert's prompt.
+    :param memory_tokens: Token budget of the earlier turns of the current module shown to both agents,
+           which multi-stage modules such as Memory need. 0 keeps the prompts stateless.
+    :param memory_tokenizer: Checkpoint whose tokenizer counts the memory's tokens, None for the Expert
+           model's own. Models without a tokenizer, such as a StaticModel, approximate the count.
+    :param prompt_style: Layout of both agents' prompts, one of agents.prompts.PROMPT_STYLES.
+    :param seed: Seed of the bomb, None for a random one.
+    :param local: Play an in-process bomb instead of connecting to the server at 'server_url'.
+    :param trace: Record the game into this trace: seed, settings, every prompt, generation,
+           action and server response, so that it can be replayed with 'agents.replay'.
+    :param verbose: Print the dialogue as it happens.
+    :return: The outcome of the game.
     """
-    defuser_client = Defuser()
-    expert_client = Expert()
-
-    try:
-        # 1) Connect both clients to the same server
-        await defuser_client.connect_to_server(server_url)
-        await expert_client.connect_to_server(server_url)
-
-        while True:
-            # 2) Defuser checks the bomb's current state
-            bomb_state = await defuser_client.run("state")
-            print("[DEFUSER sees BOMB STATE]:")
-            print(bomb_state)
-
-            if "Bomb disarmed!" in bomb_state or "Bomb exploded!" in bomb_state:
-                break
-
-            # 3) Expert retrieves the relevant manual text
-            manual_text = await expert_client.run()
-            print("[EXPERT sees MANUAL]:")
-            print(manual_text)
-
-            # 4) Expert LLM uses the manual text + defuser’s question (bomb_state)
-            #    to generate instructions
-            exp_messages = expert_prompt(manual_text, bomb_state)
-            expert_advice = expert_model.generate_response(
-                exp_messages,
-                max_new_tokens=max_new_tokens,
-                temperature=0.7,
-                top_p=0.9,
-                top_k=50,
-                do_sample=True
-            )
-            print("\n[EXPERT ADVICE to DEFUSER]:")
-            print(expert_advice)
-
-            # 5) Defuser LLM uses the bomb state + expert advice to pick a single action
-            def_messages = defuser_prompt(bomb_state, expert_advice)
-            def_action_raw = defuser_model.generate_response(
-                def_messages,
-                max_new_tokens=max_new_tokens,
-                temperature=0.7,
-                top_p=0.9,
-                top_k=50,
-                do_sample=True
-            )
-
-            # 6) Attempt to extract a known command from def_action_raw
-            #    If no recognized command is found, default to "help"
-            action = "help"
-            for line in def_action_raw.splitlines():
-                line = line.strip().lower()
-                if line.startswith(("cut", "press", "hold", "release", "help", "state")):
-                    action = line.strip()
+    log = print if verbose else (lambda *args, **kwargs: None)
+    sampling = {**DEFAULT_SAMPLING, **(sampling or {})}
+    turns = 0
+    disarmed = exploded = False
+
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    if memory_tokenizer is not None:
+        tokenizer = load_tokenizer(memory_tokenizer)
+    else:
+        tokenizer = getattr(expert_model, "tokenizer", None)
+        # Recorded, so that a replay compacts the memory exactly as this game does
+        memory_tokenizer = expert_model.checkpoint if tokenizer is not None else None
+    if trace is not None:
+        trace.seed = seed
+        trace.settings = dict(
+            max_new_tokens=max_new_tokens,
+            constrain_actions=constrain_actions,
+            retrieve_sections=retrieve_sections,
+            max_turns=max_turns,
+            sampling=sampling,
+            defuser_system=defuser_system,
+            expert_system=expert_system,
+            memory_tokens=memory_tokens,
+            memory_tokenizer=memory_tokenizer,
+            prompt_style=prompt_style
+        )
+
+    # Both roles share one resume token, so they play the same bomb and can reconnect to it
+    resume_token = uuid.uuid4().hex
+    if local:
+        game = LocalGame()
+        defuser_client = LocalDefuser(game, resume_token=resume_token, seed=seed)
+        expert_client = LocalExpert(game, resume_token=resume_token, seed=seed)
+    else:
+        defuser_client = Defuser(resume_token=resume_token, seed=seed)
+        expert_client = Expert(resume_token=resume_token, seed=seed)
+
+    memory = ConversationMemory(
+        token_budget=memory_tokens,
+        count_tokens=(lambda text: len(tokenizer.encode(text, add_special_tokens=False))) if tokenizer else None
+    )
+
+    with profiling.collect() as phases:
+        try:
+            # 1) Connect both clients to the same server
+            await defuser_client.connect_to_server(server_url)
+            await expert_client.connect_to_server(server_url)
+
+            while max_turns is None or turns < max_turns:
+                # 2) Defuser checks the bomb's current state while the Expert retrieves the manual text.
+                #    If the last action's response already described the new state, it is used as is,
+                #    and the manual is only fetched when that state belongs to a module not seen before.
+                bomb_state = defuser_client.latest_state
+                if bomb_state is None:
+                    with profiling.span("turn.state_and_manual"):
+                        bomb_state, manual_text = await asyncio.gather(
+                            defuser_client.run("state"),
+                            expert_client.run(defuser_client.manual_version)
+                        )
+                else:
+                    with profiling.span("turn.manual"):
+                        manual_text = await expert_client.run(defuser_client.manual_version)
+                log("[DEFUSER sees BOMB STATE]:")
+                log(bomb_state)
+
+                disarmed = "Bomb disarmed!" in bomb_state
+                exploded = "Bomb exploded!" in bomb_state
+                if disarmed or exploded:
                     break
 
-            print("\n[DEFUSER ACTION DECIDED]:", action)
+                # 3) Expert keeps the part of the manual that applies
+                if retrieve_sections:
+                    # Keep only the manual section that applies to the current state
+                    with profiling.span("turn.retrieve_section"):
+                        manual_text = relevant_manual(manual_text, defuser_client.module_id, bomb_state)
+                log("[EXPERT sees MANUAL]:")
+                log(manual_text)
+
+                # 4) Expert LLM uses the manual text + defuser’s question (bomb_state)
+                #    to generate instructions
+                history = memory.render(defuser_client.module_index) if memory_tokens else ""
+                exp_messages = expert_prompt(manual_text, bomb_state, expert_system, history, prompt_style)
+                with profiling.span("turn.expert_generate"):
+                    expert_advice = await expert_model.agenerate(exp_messages, max_new_tokens=max_new_tokens, **sampling)
+                log("\n[EXPERT ADVICE to DEFUSER]:")
+                log(expert_advice)
+
+                # 5) Defuser LLM uses the bomb state + expert advice to pick a single action.
+                #    When the state lists the legal commands, decoding is restricted to them.
+                def_messages = defuser_prompt(bomb_state, expert_advice, defuser_system, history, prompt_style)
+                legal_actions = parse_legal_actions(bomb_state)
+                if constrain_actions and legal_actions:
+                    with profiling.span("turn.defuser_generate", constrained=True):
+                        action = await defuser_model.agenerate_action(def_messages, legal_actions, **sampling)
+                    defuser_output = action
+                else:
+                    # 6) Stream the reply and stop generating as soon as it contains a command.
+                    #    If no recognized command is found, default to "help"
+                    parser = IncrementalActionParser(legal_actions or None)
+                    deltas = []
+                    log("\n[DEFUSER THINKS]:")
+                    with profiling.span("turn.defuser_generate", constrained=False):
+                        async with contextlib.aclosing(defuser_model.astream_response(
+                                def_messages, max_new_tokens=max_new_tokens, **sampling
+                        )) as stream:
+                            async for delta in stream:
+                                log(delta, end="", flush=True)
+                                deltas.append(delta)
+                                with profiling.span("turn.parse_action"):
+                                    parsed = parser.feed(delta)
+                                if parsed is not None:
+                                    break
+                    action = parser.finish()
+                    defuser_output = "".join(deltas)
+
+                log("\n[DEFUSER ACTION DECIDED]:", action)
 
-            # 7) Send that action to the server
-            result = await defuser_client.run(action)
-            print("[SERVER RESPONSE]:")
-            print(result)
-            print("-" * 60)
+                # 7) Send that action to the server
+                action_module = defuser_client.module_index
+                with profiling.span("turn.send_action", action=action):
+                    result = await defuser_client.run(action)
+                turns += 1
+                memory.record(action_module, bomb_state, expert_advice, action, result)
+                log("[SERVER RESPONSE]:")
+                log(result)
+                log("-" * 60)
 
-            if "BOMB SUCCESSFULLY DISARMED" in result or "BOMB HAS EXPLODED" in result:
-                break
-    finally:
-        await defuser_client.cleanup()
-        await expert_client.cleanup()
+                if trace is not None:
+                    trace.turns.append(TurnTrace(
+                        state=bomb_state,
+                        manual=manual_text,
+                        expert_messages=exp_messages,
+                        expert_output=expert_advice,
+                        defuser_messages=def_messages,
+                        defuser_output=defuser_output,
+                        action=action,
+                        response=result
+                    ))
+
+                disarmed = "BOMB SUCCESSFULLY DISARMED" in result
+                exploded = result == "BOOM!" or "BOMB HAS EXPLODED" in result
+                if disarmed or exploded:
+                    break
+        finally:
+            await defuser_client.cleanup()
+            await expert_client.cleanup()
+
+    module_index = defuser_client.module_index or 0
+    game_result = GameResult(
+        disarmed=disarmed,
+        exploded=exploded,
+        turns=turns,
+        modules_solved=(defuser_client.module_count or module_index) if disarmed else module_index,
+        failed_module=defuser_client.module_id if exploded else None,
+        phases=phases
+    )
+    if trace is not None:
+        trace.result = {key: value for key, value in asdict(game_result).items() if key != "phases"}
+    return game_result
 
 
 if __name__ == "__main__":
@@ -96,10 +247,11 @@ if __name__ == "__main__":
     defuser_checkpoint = "HuggingFaceTB/SmolLM-135M-Instruct"
     expert_checkpoint = "HuggingFaceTB/SmolLM-135M-Instruct"
 
+    # Both roles load the same checkpoint, so they share one copy of the weights via the model registry
     defuser_model = SmollLLM(defuser_checkpoint, device="cpu")
     expert_model = SmollLLM(expert_checkpoint, device="cpu")
 
-    asyncio.run(
+    game_result = asyncio.run(
         run_two_agents(
             defuser_model=defuser_model,
             expert_model=expert_model,
@@ -107,3 +259,9 @@ if __name__ == "__main__":
             max_new_tokens=50
         )
     )
+
+    # With BOMB_PROFILE=trace.json, write the Chrome trace there and print where the time went
+    if profiling.is_enabled():
+        profiling.export_chrome_trace(os.environ["BOMB_PROFILE"])
+        for phase, totals in sorted(game_result.phases.items(), key=lambda item: -item[1]["seconds"]):
+            print(f"{phase:>24}: {totals['seconds']:8.3f}s over {totals['count']} spans")
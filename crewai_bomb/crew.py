@@ -1,89 +1,232 @@
+import argparse
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Optional
+
 from ml_collections import ConfigDict
 from crewai import Agent, Crew, Task, LLM, Process
-from crewai_bomb.tools import DefuserTool, ExpertTool
-
-model_config = ConfigDict()
-model_config.extra = 'allow'
-llm = LLM(
-    model='ollama/qwen2.5',
-    model_config=model_config
-)
-
-defuser_tool = DefuserTool()
-expert_tool  = ExpertTool()
-
-defuser_agent = Agent(
-    name='DefuserAgent',
-    role='Defuser',
-    goal='Describe module state, ask Expert, then act until disarmed or exploded.',
-    backstory='You see the bomb’s modules but cannot view the manual.',
-    llm=llm,
-    tools=[defuser_tool]
-)
-
-expert_agent = Agent(
-    name='ExpertAgent',
-    role='Expert',
-    goal='Provide precise instructions from the manual to disarm modules.',
-    backstory='You have the manual but cannot see the bomb’s display.',
-    llm=llm,
-    tools=[expert_tool]
-)
+from crewai_bomb.tools import SERVER_URL, BombSession, DefuserTool, ExpertTool
 
-if __name__ == '__main__':
-    # Game loop: always build each Crew with both agents + the single Task
-    while True:
-        # a) Defuser asks for bomb state
-        task_state = Task(
-            agent=defuser_agent,     
-            tool='defuser_action',
-            input='state',
-            description='Retrieve current bomb module state',
-            expected_output='Text describing the module state'
+# The crew's LLM, e.g. CREW_MODEL=ollama_chat/fake CREW_BASE_URL=http://localhost:11435 for crewai_bomb.fake_llm
+DEFAULT_MODEL = os.environ.get('CREW_MODEL', 'ollama/qwen2.5')
+DEFAULT_BASE_URL = os.environ.get('CREW_BASE_URL')
+DEFAULT_API_KEY = os.environ.get('CREW_API_KEY')
+
+
+class Phase(Enum):
+    """Where the game loop of a BombCrew stands."""
+    READY = 'ready'
+    PLAYING = 'playing'
+    DONE = 'done'
+
+
+@dataclass
+class CrewMetrics:
+    """Timings of one BombCrew: its one-time setup and every turn played since."""
+    setup_seconds: float = 0.0
+    turn_seconds: List[float] = field(default_factory=list)
+
+    @property
+    def turns(self) -> int:
+        return len(self.turn_seconds)
+
+    @property
+    def mean_turn_seconds(self) -> Optional[float]:
+        return sum(self.turn_seconds) / self.turns if self.turns else None
+
+    @property
+    def total_seconds(self) -> float:
+        return self.setup_seconds + sum(self.turn_seconds)
+
+
+class BombCrew:
+    """
+    The Defuser and Expert agents as one crew that is built once and kicked off once per turn.
+
+    A turn is three sequential tasks: the Defuser reads the state, the Expert looks up
+    the manual for it, and the Defuser acts on the Expert's instruction. The tasks pass
+    their outputs on as context and are templated with the turn number and the last
+    result, so the agents, tools, LLM connection and crew are reused for the whole game.
+
+    Both tools play the crew's own bomb through one BombSession. Crews on different
+    bombs can be played concurrently in one process with 'aplay'.
+    """
+
+    def __init__(
+            self,
+            model: str = DEFAULT_MODEL,
+            base_url: Optional[str] = DEFAULT_BASE_URL,
+            api_key: Optional[str] = DEFAULT_API_KEY,
+            server_url: str = SERVER_URL,
+            seed: Optional[int] = None,
+            verbose: bool = False
+    ) -> None:
+        """
+        :param model: The LiteLLM model name both agents run on.
+        :param base_url: Endpoint of the model's API, None for the provider's default.
+        :param api_key: Key of the model's API, if it needs one.
+        :param server_url: The URL of the bomb-defusal server.
+        :param seed: Seed the server creates the crew's bomb from.
+        :param verbose: Let CrewAI log every task.
+        """
+        start = time.perf_counter()
+        model_config = ConfigDict()
+        model_config.extra = 'allow'
+        self.llm = LLM(model=model, base_url=base_url, api_key=api_key, model_config=model_config)
+
+        self.session = BombSession(server_url, seed=seed)
+        self.defuser_tool = DefuserTool(self.session)
+        self.expert_tool = ExpertTool(self.session)
+
+        self.defuser_agent = Agent(
+            name='DefuserAgent',
+            role='Defuser',
+            goal='Describe module state, ask Expert, then act until disarmed or exploded.',
+            backstory='You see the bomb’s modules but cannot view the manual.',
+            llm=self.llm,
+            tools=[self.defuser_tool]
         )
-        crew_state = Crew(
-            agents=[defuser_agent, expert_agent],
-            tasks=[task_state],
-            process=Process.sequential,
-            verbose=False
+        self.expert_agent = Agent(
+            name='ExpertAgent',
+            role='Expert',
+            goal='Provide precise instructions from the manual to disarm modules.',
+            backstory='You have the manual but cannot see the bomb’s display.',
+            llm=self.llm,
+            tools=[self.expert_tool]
         )
-        state = crew_state.kickoff().raw
-        print(f"\n[Defuser received state:]\n{state}")
-        if 'BOOM!' in state or 'DISARMED' in state:
-            break
-
-        # b) Expert provides instructions based on that state
-        task_manual = Task(
-            agent=expert_agent,     
-            tool='expert_manual',
-            input=state,
-            description='Get manual instructions for this state',
-            expected_output='Manual excerpt text'
+
+        # {turn} and {last_result} are filled in from the inputs of every kickoff
+        self.state_task = Task(
+            agent=self.defuser_agent,
+            tools=[self.defuser_tool],
+            description=(
+                'Turn {turn}. The previous action returned:\n{last_result}\n\n'
+                "Retrieve the current bomb module state by running the command 'state'."
+            ),
+            expected_output='Text describing the module state'
         )
-        crew_manual = Crew(
-            agents=[defuser_agent, expert_agent],
-            tasks=[task_manual],
-            process=Process.sequential,
-            verbose=False
+        self.manual_task = Task(
+            agent=self.expert_agent,
+            tools=[self.expert_tool],
+            context=[self.state_task],
+            description='Turn {turn}. Get the manual instructions for the module state you were given.',
+            expected_output='The single command the Defuser should run next'
         )
-        instruction = crew_manual.kickoff().raw
-        print(f"\n[Expert suggests:]\n{instruction}")
-
-        # c) Defuser executes the Expert’s instruction
-        task_action = Task(
-            agent=defuser_agent,     
-            tool='defuser_action',
-            input=instruction,
-            description='Execute the expert instruction',
+        self.action_task = Task(
+            agent=self.defuser_agent,
+            tools=[self.defuser_tool],
+            context=[self.state_task, self.manual_task],
+            description="Turn {turn}. Execute the Expert's instruction on the bomb.",
             expected_output='Result of the action'
         )
-        crew_action = Crew(
-            agents=[defuser_agent, expert_agent],
-            tasks=[task_action],
+        self.crew = Crew(
+            agents=[self.defuser_agent, self.expert_agent],
+            tasks=[self.state_task, self.manual_task, self.action_task],
             process=Process.sequential,
-            verbose=False
+            verbose=verbose
         )
-        result = crew_action.kickoff().raw
+
+        self.phase = Phase.READY
+        self.last_result = 'Nothing yet, this is the first turn.'
+        self.metrics = CrewMetrics(setup_seconds=time.perf_counter() - start)
+
+    def step(self) -> str:
+        """
+        Play one turn.
+
+        :return: The server's response to the turn's action.
+        """
+        inputs = self._start_turn()
+        start = time.perf_counter()
+        output = self.crew.kickoff(inputs=inputs)
+        self.metrics.turn_seconds.append(time.perf_counter() - start)
+        return self._end_turn(output)
+
+    async def astep(self) -> str:
+        """
+        Play one turn without blocking the event loop. The tools' calls run on this loop,
+        alongside those of other crews.
+
+        :return: The server's response to the turn's action.
+        """
+        inputs = self._start_turn()
+        start = time.perf_counter()
+        # The kickoff runs in a worker thread; binding the session first makes its tools hop back onto this loop
+        await self.session.connect()
+        output = await self.crew.kickoff_async(inputs=inputs)
+        self.metrics.turn_seconds.append(time.perf_counter() - start)
+        return self._end_turn(output)
+
+    def _start_turn(self) -> dict:
+        if self.phase is Phase.DONE:
+            raise RuntimeError('The game is over')
+        self.phase = Phase.PLAYING
+        return {'turn': self.metrics.turns + 1, 'last_result': self.last_result}
+
+    def _end_turn(self, output) -> str:
+        state, instruction, result = (task.raw for task in output.tasks_output)
+        print(f"\n[Defuser received state:]\n{state}")
+        print(f"\n[Expert suggests:]\n{instruction}")
         print(f"\n[Defuser executes:]\n{result}")
-        if 'BOOM!' in result or 'DISARMED' in result:
-            break
\ No newline at end of file
+
+        self.last_result = result
+        # The agents' texts may quote or misreport the server, so only its actual response ends the game
+        if self.session.game_over:
+            self.phase = Phase.DONE
+        return result
+
+    def play(self, max_turns: Optional[int] = None) -> CrewMetrics:
+        """
+        Play turns until the bomb is disarmed or explodes.
+
+        :param max_turns: Give up after this many turns, None to play until the game ends.
+        :return: The crew's metrics.
+        """
+        try:
+            while self.phase is not Phase.DONE and (max_turns is None or self.metrics.turns < max_turns):
+                self.step()
+        finally:
+            self.session.close()
+        return self.metrics
+
+    async def aplay(self, max_turns: Optional[int] = None) -> CrewMetrics:
+        """
+        Play turns until the bomb is disarmed or explodes, on the running event loop.
+
+        :param max_turns: Give up after this many turns, None to play until the game ends.
+        :return: The crew's metrics.
+        """
+        try:
+            while self.phase is not Phase.DONE and (max_turns is None or self.metrics.turns < max_turns):
+                await self.astep()
+        finally:
+            await self.session.cleanup()
+        return self.metrics
+
+
+async def play_concurrently(crews: List[BombCrew], max_turns: Optional[int] = None) -> List[CrewMetrics]:
+    """Play every crew's game at the same time on the running event loop."""
+    return await asyncio.gather(*(crew.aplay(max_turns) for crew in crews))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play the bomb with CrewAI crews')
+    parser.add_argument('--model', default=DEFAULT_MODEL, help='LiteLLM model name of both agents')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='Endpoint of the model, e.g. of crewai_bomb.fake_llm')
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--server-url', default=SERVER_URL)
+    parser.add_argument('--crews', type=int, default=1, help='Crews playing bombs of their own concurrently')
+    parser.add_argument('--max-turns', type=int, default=None)
+    args = parser.parse_args()
+
+    crews = [BombCrew(args.model, args.base_url, args.api_key, args.server_url) for _ in range(args.crews)]
+    if len(crews) == 1:
+        all_metrics = [crews[0].play(args.max_turns)]
+    else:
+        all_metrics = asyncio.run(play_concurrently(crews, args.max_turns))
+    for metrics in all_metrics:
+        print(f"\nSetup {metrics.setup_seconds:.2f}s, {metrics.turns} turns, "
+              f"{metrics.mean_turn_seconds or 0:.2f}s per turn, {metrics.total_seconds:.2f}s in total")
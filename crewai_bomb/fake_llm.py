@@ -0,0 +1,233 @@
+"""
+A local stand-in for the crew's LLM, to measure CrewAI's own overhead offline.
+
+    python -m crewai_bomb.fake_llm --mode oracle --latency 0.05 --port 11435
+    CREW_MODEL=ollama_chat/fake CREW_BASE_URL=http://localhost:11435 python -m crewai_bomb.crew
+
+It serves the Ollama chat and generate endpoints and the OpenAI chat completions
+endpoint ('openai/fake' with base URL http://localhost:11435/v1). Every completion is
+delayed by a fixed latency. It is answered in one of two modes:
+
+- canned: the given responses in turn, by default a final answer without any tool call,
+  which leaves only the orchestration itself to measure;
+- oracle: the ReAct steps a perfect player would take. It calls the crew's tools and
+  answers with the commands of the game's rules in agents.rules.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from agents.memory import approximate_tokens
+from agents.rules import RuleSolver
+
+Messages = List[Dict[str, str]]
+
+FAKE_MODEL = 'fake'
+# CrewAI's format instructions describe an observation with this text, which is not one
+OBSERVATION_PLACEHOLDER = 'the result of the action'
+OBSERVATION = re.compile(r'\nObservation:[ \t]*')
+# Words of the crew's state task, see crewai_bomb.crew.BombCrew
+STATE_TASK_MARKER = "command 'state'"
+
+
+def thought_action(tool: str, arguments: Dict[str, str]) -> str:
+    """A ReAct step calling a tool."""
+    return f'Thought: I should use the {tool} tool.\nAction: {tool}\nAction Input: {json.dumps(arguments)}'
+
+
+def final_answer(answer: str) -> str:
+    """A ReAct step ending the task."""
+    return f'Thought: I now know the final answer\nFinal Answer: {answer}'
+
+
+def split_observation(text: str) -> Tuple[str, Optional[str]]:
+    """
+    The text of a conversation before its first tool result, and the last tool result.
+
+    :return: (text, None) if no tool has been called yet.
+    """
+    observations = [m for m in OBSERVATION.finditer(text) if not text.startswith(OBSERVATION_PLACEHOLDER, m.end())]
+    if not observations:
+        return text, None
+    last = observations[-1]
+    return text[:observations[0].start()], text[last.end():].strip()
+
+
+class CannedResponder:
+    """Answers with the given responses in turn, whatever the prompt."""
+
+    def __init__(self, responses: Optional[List[str]] = None):
+        """
+        :param responses: The completions to cycle through; a final answer of 'help' by default.
+        """
+        self._responses = itertools.cycle(responses or [final_answer('help')])
+
+    def __call__(self, messages: Messages) -> str:
+        return next(self._responses)
+
+
+class OracleResponder:
+    """
+    Plays the crew's tasks perfectly: the Defuser reads the state and runs the correct
+    command, and the Expert reads the manual and answers with the correct command.
+
+    The rules remember the presses of the current Memory module, so serve
+    one crew per fake server when the bombs have Memory modules.
+    """
+
+    def __init__(self):
+        self.rules = RuleSolver()
+
+    def __call__(self, messages: Messages) -> str:
+        text = '\n\n'.join(message.get('content') or '' for message in messages)
+        task, observation = split_observation(text)
+
+        if 'expert_manual' in text and 'defuser_action' not in text:
+            if observation is None:
+                return thought_action('expert_manual', {})
+            return final_answer(self.rules.solve(task) or 'help')
+
+        if observation is not None:
+            return final_answer(observation)
+        if STATE_TASK_MARKER in task:
+            return thought_action('defuser_action', {'command': 'state'})
+        return thought_action('defuser_action', {'command': self.rules.solve(task) or 'state'})
+
+
+RESPONDERS: Dict[str, Callable[..., Callable[[Messages], str]]] = {
+    'canned': CannedResponder,
+    'oracle': OracleResponder,
+}
+
+
+def create_app(responder: Callable[[Messages], str], latency: float = 0.0) -> Starlette:
+    """
+    Create the Starlette application of the fake LLM.
+
+    :param responder: Turns the messages of a request into the completion.
+    :param latency: Seconds every completion takes.
+    """
+    stats = {'completions': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    async def complete(messages: Messages) -> str:
+        await asyncio.sleep(latency)
+        content = responder(messages)
+        stats['completions'] += 1
+        stats['prompt_tokens'] += sum(approximate_tokens(m.get('content') or '') for m in messages)
+        stats['completion_tokens'] += approximate_tokens(content)
+        return content
+
+    def ndjson(*chunks: dict) -> StreamingResponse:
+        return StreamingResponse((json.dumps(chunk) + '\n' for chunk in chunks), media_type='application/x-ndjson')
+
+    async def ollama_chat(request: Request) -> Response:
+        body = await request.json()
+        content = await complete(body.get('messages', []))
+        reply = {
+            'model': body.get('model', FAKE_MODEL),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'done_reason': 'stop',
+        }
+        if body.get('stream', True):
+            return ndjson({**reply, 'done': False, 'done_reason': None},
+                          {**reply, 'message': {'role': 'assistant', 'content': ''}})
+        return JSONResponse(reply)
+
+    async def ollama_generate(request: Request) -> Response:
+        body = await request.json()
+        messages = [{'role': 'system', 'content': body['system']}] if body.get('system') else []
+        content = await complete(messages + [{'role': 'user', 'content': body.get('prompt', '')}])
+        reply = {
+            'model': body.get('model', FAKE_MODEL),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'response': content,
+            'done': True,
+            'done_reason': 'stop',
+        }
+        if body.get('stream', True):
+            return ndjson({**reply, 'done': False, 'done_reason': None}, {**reply, 'response': ''})
+        return JSONResponse(reply)
+
+    async def ollama_tags(request: Request) -> Response:
+        return JSONResponse({'models': [{'name': FAKE_MODEL, 'model': FAKE_MODEL}]})
+
+    async def ollama_show(request: Request) -> Response:
+        return JSONResponse({'template': '', 'details': {'family': FAKE_MODEL}, 'model_info': {}})
+
+    async def openai_chat(request: Request) -> Response:
+        body = await request.json()
+        messages = body.get('messages', [])
+        content = await complete(messages)
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        created = int(time.time())
+        model = body.get('model', FAKE_MODEL)
+        if body.get('stream'):
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model}
+            events = [
+                {**chunk, 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': content},
+                                       'finish_reason': None}]},
+                {**chunk, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]},
+            ]
+            lines = [f'data: {json.dumps(event)}\n\n' for event in events] + ['data: [DONE]\n\n']
+            return StreamingResponse(iter(lines), media_type='text/event-stream')
+        prompt_tokens = sum(approximate_tokens(m.get('content') or '') for m in messages)
+        completion_tokens = approximate_tokens(content)
+        return JSONResponse({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+    async def openai_models(request: Request) -> Response:
+        return JSONResponse({'object': 'list', 'data': [{'id': FAKE_MODEL, 'object': 'model'}]})
+
+    async def get_stats(request: Request) -> Response:
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route('/api/chat', ollama_chat, methods=['POST']),
+        Route('/api/generate', ollama_generate, methods=['POST']),
+        Route('/api/tags', ollama_tags, methods=['GET']),
+        Route('/api/show', ollama_show, methods=['POST']),
+        Route('/v1/chat/completions', openai_chat, methods=['POST']),
+        Route('/v1/models', openai_models, methods=['GET']),
+        Route('/stats', get_stats, methods=['GET']),
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a fake LLM over the Ollama and OpenAI APIs')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind to')
+    parser.add_argument('--port', type=int, default=11435, help='Port to listen on')
+    parser.add_argument('--mode', choices=sorted(RESPONDERS), default='oracle')
+    parser.add_argument('--responses', default=None, help='JSON list of completions for the canned mode')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every completion takes')
+    args = parser.parse_args()
+
+    if args.mode == 'canned' and args.responses:
+        with open(args.responses) as f:
+            responder = CannedResponder(json.load(f))
+    else:
+        responder = RESPONDERS[args.mode]()
+
+    uvicorn.run(create_app(responder, args.latency), host=args.host, port=args.port)
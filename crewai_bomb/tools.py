@@ -1,11 +1,147 @@
 from crewai.tools import BaseTool
 import asyncio
+import threading
+import uuid
+from typing import Any, Awaitable, Optional, TypeVar
 from game_mcp.game_client import Defuser, Expert
 from pydantic import BaseModel, Extra
 
 # Default bomb server URL (can be overridden at runtime)
 SERVER_URL = 'http://localhost:8080'
 
+T = TypeVar('T')
+
+
+def game_over(text: str) -> bool:
+    """Whether a server response ends the game."""
+    return 'BOOM!' in text or 'DISARMED' in text
+
+
+class BombSession:
+    """
+    One bomb on the server, played through a Defuser and an Expert client that stay
+    connected for the whole game.
+
+    The clients live on a single event loop: the loop of the first async call, or a
+    background loop the session starts when it is first used synchronously. Async
+    callers on that loop await the clients directly, and everyone else hands the
+    call over to it. Crews playing different bombs can therefore share one process
+    and one loop, each with its own session.
+    """
+
+    def __init__(self, server_url: str = SERVER_URL, resume_token: Optional[str] = None, seed: Optional[int] = None):
+        """
+        :param server_url: The URL of the bomb-defusal server.
+        :param resume_token: The bomb to play; a fresh bomb of its own by default.
+        :param seed: Seed the server creates the bomb from.
+        """
+        self.server_url = server_url
+        token = resume_token or uuid.uuid4().hex
+        self.defuser = Defuser(resume_token=token, seed=seed)
+        self.expert = Expert(resume_token=token, seed=seed)
+        # The server's response to the Defuser's last command, whatever the agents made of it
+        self.last_response: Optional[str] = None
+        self._connected = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        # A client reads its own SSE stream, so it serves one call at a time
+        self._connect_lock = asyncio.Lock()
+        self._defuser_lock = asyncio.Lock()
+        self._expert_lock = asyncio.Lock()
+
+    @property
+    def game_over(self) -> bool:
+        """Whether the server's last response to the Defuser ended the game."""
+        return self.last_response is not None and game_over(self.last_response)
+
+    async def connect(self):
+        """Connect both clients, binding the session to the running loop if it has none yet."""
+        await self._on_loop(self._connect())
+
+    async def defuse(self, command: str) -> str:
+        """Run a Defuser command and return the server's response."""
+        return await self._on_loop(self._defuse(command))
+
+    async def manual(self) -> str:
+        """The manual of the current module, from the Expert's cache when it holds it."""
+        return await self._on_loop(self._manual())
+
+    async def cleanup(self):
+        """Disconnect both clients. The session reconnects when it is used again."""
+        await self._on_loop(self._cleanup())
+
+    def run_sync(self, coroutine: Awaitable[T]) -> T:
+        """
+        Wait for one of the session's coroutines from synchronous code.
+
+        It runs on the session's loop, which is started in the background if there is
+        none yet. Blocking the session's own loop would deadlock it, so a synchronous
+        call from a coroutine on that loop is refused: await the coroutine instead.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self._loop is None:
+            self._start_background_loop()
+        if running is self._loop:
+            coroutine.close()
+            raise RuntimeError('Called synchronously from the session\'s own event loop; await the async method instead')
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        """Disconnect both clients and stop the background loop, if the session started one."""
+        if self._connected and self._loop is not None and not self._loop.is_closed():
+            self.run_sync(self._cleanup())
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._thread = None
+
+    def _start_background_loop(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='bomb-session', daemon=True)
+        self._thread.start()
+
+    async def _on_loop(self, coroutine: Awaitable[T]) -> T:
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            # The first async caller's loop becomes the session's loop
+            self._loop = loop
+        elif self._loop.is_closed():
+            raise RuntimeError('The session\'s event loop is closed; play on with a new session')
+        if loop is self._loop:
+            return await coroutine
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self._loop))
+
+    async def _connect(self):
+        if not self._connected:
+            async with self._connect_lock:
+                if not self._connected:
+                    await asyncio.gather(
+                        self.defuser.connect_to_server(self.server_url),
+                        self.expert.connect_to_server(self.server_url)
+                    )
+                    self._connected = True
+
+    async def _defuse(self, command: str) -> str:
+        await self._connect()
+        async with self._defuser_lock:
+            self.last_response = await self.defuser.run(command)
+            return self.last_response
+
+    async def _manual(self) -> str:
+        await self._connect()
+        async with self._expert_lock:
+            return await self.expert.run(self.defuser.manual_version)
+
+    async def _cleanup(self):
+        if self._connected:
+            await asyncio.gather(self.defuser.cleanup(), self.expert.cleanup())
+            self._connected = False
+
+
 class DefuserArgs(BaseModel):
     command: str
     class Config:
@@ -19,12 +155,22 @@ class ExpertArgs(BaseModel):
 class DefuserTool(BaseTool):
     """
     Tool that executes a defuser command on the bomb and returns the server response.
+
+    The tool is synchronous only: crewai calls '_run' even under 'kickoff_async', from a
+    worker thread, and the call hops over to the session's event loop.
     """
-    def __init__(self):
+    session: Any = None
+
+    def __init__(self, session: BombSession):
+        """
+        :param session: The bomb to play. Pass the same session to the ExpertTool of the
+               crew, or the two tools play different bombs.
+        """
         super().__init__(
             name="defuser_action",
             description="Execute a defuser command on the bomb and return the server response.",
-            args_schema=DefuserArgs
+            args_schema=DefuserArgs,
+            session=session
         )
 
     def _run(self, **kwargs) -> str:
@@ -32,23 +178,26 @@ class DefuserTool(BaseTool):
         Executes a defuser command and returns the server's response.
         """
         args = DefuserArgs(**kwargs)
-        client = Defuser()
-        async def run():
-            await client.connect_to_server(SERVER_URL)
-            res = await client.run(args.command)
-            await client.cleanup()
-            return res
-        return asyncio.run(run())
+        return self.session.run_sync(self.session.defuse(args.command))
 
 class ExpertTool(BaseTool):
     """
     Tool that retrieves the current module's instructions from the manual.
+
+    Synchronous only, like DefuserTool.
     """
-    def __init__(self):
+    session: Any = None
+
+    def __init__(self, session: BombSession):
+        """
+        :param session: The bomb to play. Pass the same session to the DefuserTool of the
+               crew, or the two tools play different bombs.
+        """
         super().__init__(
             name="expert_manual",
             description="Retrieve the current module's instructions from the manual.",
-            args_schema=ExpertArgs
+            args_schema=ExpertArgs,
+            session=session
         )
 
     def _run(self, **kwargs) -> str:
@@ -56,10 +205,4 @@ class ExpertTool(BaseTool):
         Retrieves the manual instructions for the current bomb module.
         """
         _ = ExpertArgs(**kwargs)
-        client = Expert()
-        async def run():
-            await client.connect_to_server(SERVER_URL)
-            res = await client.run()
-            await client.cleanup()
-            return res
-        return asyncio.run(run())
+        return self.session.run_sync(self.session.manual())
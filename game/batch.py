@@ -0,0 +1,167 @@
+"""
+Non-interactive play: push command scripts through the game engine at engine speed.
+
+    python -m game.main batch commands.txt --seed 0 --games 1000 --jobs 8 --output results.jsonl
+    cat commands.txt | python -m game.main batch -
+
+A script has one command per line, as typed in the interactive game; blank lines and
+lines starting with '#' are skipped. Every script is played on a full bomb per seed,
+until the script ends, 'quit' is read or the bomb is disarmed or explodes. Each game
+is written as one JSON line.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from game.bomb import DEFAULT_SEQUENCE, Bomb, expand_sequence
+from game.modules.module import ActionResult
+
+ACTION_PREFIXES = ("cut", "press", "hold", "release")
+# Commands of the interactive game that only show text and leave the bomb as it is
+DISPLAY_COMMANDS = ("help", "manual", "state")
+QUIT_COMMANDS = ("quit", "exit")
+
+
+def parse_script(text: str) -> list[str]:
+    """The commands of a script, normalized as the interactive game reads them."""
+    commands = []
+    for line in text.splitlines():
+        command = line.strip().lower()
+        if command and not command.startswith("#"):
+            commands.append(command)
+    return commands
+
+
+def read_script(path: str) -> list[str]:
+    """The commands of the script file at 'path', or of standard input for '-'."""
+    if path == "-":
+        return parse_script(sys.stdin.read())
+    with open(path) as f:
+        return parse_script(f.read())
+
+
+def play_script(
+        commands: list[str],
+        seed: int,
+        transcript: bool = False,
+        sequence: Iterable[str] = DEFAULT_SEQUENCE,
+) -> dict:
+    """
+    Play a script on the bomb of a seed.
+
+    Args:
+        commands: The commands to play, in order.
+        seed: Seed of the bomb.
+        transcript: Also return every played command with its result.
+        sequence: The modules of the bomb, as accepted by Bomb.
+
+    Returns:
+        The outcome: whether the bomb was disarmed or exploded, the modules solved, the
+        module the bomb exploded on, and how many commands were played, rejected,
+        unknown or left unplayed when the game ended.
+    """
+    start = time.perf_counter()
+    bomb = Bomb(seed, sequence)
+    played = incorrect = unknown = 0
+    steps = []
+
+    for command in commands:
+        if bomb.exploded or bomb.disarmed or command in QUIT_COMMANDS:
+            break
+        played += 1
+        if command.startswith(ACTION_PREFIXES):
+            result = bomb.do_action(command).name.lower()
+            incorrect += result == ActionResult.INCORRECT.name.lower()
+        elif command in DISPLAY_COMMANDS:
+            result = "shown"
+        else:
+            result = "unknown"
+            unknown += 1
+        if transcript:
+            steps.append({"command": command, "result": result})
+
+    outcome = {
+        "seed": seed,
+        "disarmed": bomb.disarmed,
+        "exploded": bomb.exploded,
+        "modules_solved": bomb.current_module,
+        "failed_module": bomb.module.module_id if bomb.exploded else None,
+        "commands_played": played,
+        "incorrect": incorrect,
+        "unknown": unknown,
+        "unplayed": len(commands) - played,
+        "seconds": time.perf_counter() - start,
+    }
+    if transcript:
+        outcome["transcript"] = steps
+    return outcome
+
+
+def _play_job(job: tuple[str, list[str], int, bool, list[str]]) -> dict:
+    script, commands, seed, transcript, sequence = job
+    return {"script": script, **play_script(commands, seed, transcript, sequence)}
+
+
+def run_batch(
+        scripts: dict[str, list[str]],
+        seeds: Iterable[int],
+        jobs: int = 1,
+        transcript: bool = False,
+        sequence: Iterable[str] = DEFAULT_SEQUENCE,
+) -> Iterator[dict]:
+    """
+    Play every script on the bomb of every seed.
+
+    Args:
+        scripts: The commands of every script, by script name.
+        seeds: The seeds of the bombs each script is played on.
+        jobs: Number of processes; 1 plays every game in this process.
+        transcript: Also return every played command with its result.
+        sequence: The modules of every bomb, as accepted by Bomb.
+
+    Yields:
+        The outcome of every game, tagged with its script, in script and seed order.
+    """
+    sequence = list(sequence)
+    # Every script is played on every seed, so a one-shot iterator of seeds must not run dry after the first script
+    seeds = list(seeds)
+    work = [(name, commands, seed, transcript, sequence) for name, commands in scripts.items() for seed in seeds]
+    if jobs <= 1:
+        yield from map(_play_job, work)
+        return
+    with ProcessPoolExecutor(jobs) as pool:
+        # Games take microseconds, so they are handed to the workers in large chunks
+        yield from pool.map(_play_job, work, chunksize=max(1, len(work) // (jobs * 4)))
+
+
+def main(argv: list[str] | None = None):
+    """Parse the arguments of batch mode and write the outcome of every game as a JSON line."""
+    parser = argparse.ArgumentParser(prog="python -m game.main batch", description="Play command scripts on seeded bombs")
+    parser.add_argument("scripts", nargs="+", help="Script files, one command per line; '-' reads standard input")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first bomb")
+    parser.add_argument("--games", type=int, default=1, help="Bombs per script, seeded seed, seed + 1, ...")
+    parser.add_argument("--jobs", type=int, default=1, help="Processes playing games in parallel")
+    parser.add_argument("--output", default="-", help="JSON lines file of the outcomes; '-' for standard output")
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_SEQUENCE),
+                        help="Module sequence of every bomb, e.g. wires button random*10")
+    parser.add_argument("--transcript", action="store_true", help="Include every command and its result")
+    args = parser.parse_args(argv)
+
+    try:
+        sequence = expand_sequence(args.modules)
+        # Check the module names once here, rather than failing in the first game of every worker
+        Bomb(None, sequence)
+    except ValueError as error:
+        parser.error(str(error))
+    scripts = {path: read_script(path) for path in args.scripts}
+    seeds = range(args.seed, args.seed + args.games)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for outcome in run_batch(scripts, seeds, args.jobs, args.transcript, sequence):
+            out.write(json.dumps(outcome) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
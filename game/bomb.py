@@ -1,17 +1,86 @@
+import random
+from typing import Callable, Iterable
+
 from game.modules.regular_wires_module import RegularWiresModule
 from game.modules.button_module import ButtonModule
 from game.modules.memory_module import MemoryModule
 from game.modules.simon_says_module import SimonSaysModule
-from game.modules.module import ActionResult
+from game.modules.module import ActionResult, Module
+
+# Constructors of the module types by name, each taking the module's source of randomness
+MODULE_FACTORIES: dict[str, Callable[[random.Random | None], Module]] = {
+    "wires": RegularWiresModule,
+    "button": ButtonModule,
+    "simon": SimonSaysModule,
+    "memory": MemoryModule,
+}
+# Name in a module sequence that stands for a module type picked at random
+RANDOM_MODULE = "random"
+DEFAULT_SEQUENCE = ("wires", "button", "simon", "memory")
+
+
+def expand_sequence(tokens: Iterable[str]) -> list[str]:
+    """
+    A module sequence from names that may carry a repeat count, e.g. ['wires', 'random*3'].
+
+    Raises:
+        ValueError: If a repeat count is not a positive number.
+    """
+    sequence = []
+    for token in tokens:
+        name, _, count = token.lower().partition("*")
+        if count and (not count.isdigit() or int(count) < 1):
+            raise ValueError(f"Invalid repeat count in '{token}'")
+        sequence += [name] * (int(count) if count else 1)
+    return sequence
 
 
 class Bomb:
-    def __init__(self):
-        self.modules = [RegularWiresModule(), ButtonModule(), SimonSaysModule(), MemoryModule()]
+    def __init__(self, seed: int | None = None, sequence: Iterable[str] = DEFAULT_SEQUENCE):
+        """
+        Args:
+            seed: Seed of the bomb's modules. The same seed and the same actions always
+                give the same states, so a game can be replayed. None for a random bomb.
+            sequence: Names of the modules to solve in order, keys of MODULE_FACTORIES or
+                RANDOM_MODULE. A module is only constructed when it becomes current, so
+                long sequences cost no more to start or hold than short ones.
+
+        Raises:
+            ValueError: If the sequence is empty or names an unknown module.
+        """
+        self.sequence = list(sequence)
+        unknown = [name for name in self.sequence if name not in MODULE_FACTORIES and name != RANDOM_MODULE]
+        if not self.sequence or unknown:
+            raise ValueError(f"Invalid module sequence {self.sequence}, "
+                             f"expected names of {sorted(MODULE_FACTORIES)} or '{RANDOM_MODULE}'")
+        self.seed = seed
+        # Only draws the type and seed of every module, so a module is the same however the earlier ones were played
+        self._rng = random.Random(seed) if seed is not None else None
+        self._module: Module | None = None
         self.current_module = 0
         self.exploded = False
         self.disarmed = False
 
+    @property
+    def module_count(self) -> int:
+        return len(self.sequence)
+
+    @property
+    def module(self) -> Module | None:
+        """The current module, constructed when it is first needed; None once the bomb is disarmed."""
+        if self._module is None and self.current_module < self.module_count:
+            self._module = self._build(self.sequence[self.current_module])
+        return self._module
+
+    def _build(self, name: str) -> Module:
+        if self._rng is None:
+            if name == RANDOM_MODULE:
+                name = random.choice(list(MODULE_FACTORIES))
+            return MODULE_FACTORIES[name](None)
+        if name == RANDOM_MODULE:
+            name = self._rng.choice(list(MODULE_FACTORIES))
+        return MODULE_FACTORIES[name](random.Random(self._rng.getrandbits(64)))
+
     def explode(self):
         self.exploded = True
 
@@ -24,11 +93,13 @@ class Bomb:
         if self.disarmed:
             return ActionResult.DISARMED
 
-        result = self.modules[self.current_module].do_action(action)
+        result = self.module.do_action(action)
 
         if result == ActionResult.DISARMED:
+            # A solved module is not needed anymore
+            self._module = None
             self.current_module += 1
-            if self.current_module >= len(self.modules):
+            if self.current_module >= self.module_count:
                 self.disarm()
                 return ActionResult.DISARMED
 
@@ -46,4 +117,4 @@ class Bomb:
         if self.disarmed:
             return "Bomb disarmed!", []
 
-        return self.modules[self.current_module].state()
\ No newline at end of file
+        return self.module.state()
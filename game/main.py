@@ -1,10 +1,9 @@
+import argparse
 import sys
-import random
+import time
+from game import batch
+from game.bomb import DEFAULT_SEQUENCE, Bomb, expand_sequence
 from game.modules.module import ActionResult
-from game.modules.regular_wires_module import RegularWiresModule
-from game.modules.button_module import ButtonModule
-from game.modules.memory_module import MemoryModule
-from game.modules.simon_says_module import SimonSaysModule
 
 # ANSI color codes
 GREEN = "\033[92m"
@@ -29,13 +28,17 @@ def print_help():
     print("  Each module has specific rules that must be followed precisely.")
     print("  Communication is key - the defuser must clearly describe what they see,")
     print("  and the expert must provide clear instructions based on the manual.")
-    print("\nUsage: python main.py [module_name]")
+    print("\nUsage: python main.py module_name... [--seed N]")
+    print("       python main.py batch SCRIPT... [--seed N] [--games N] [--jobs N] [--modules NAME...]")
+    print("\nThe named modules are solved in order; 'name*N' repeats a module N times.")
     print("\nAvailable modules:")
     print("  wires    - Regular Wires Module")
     print("  button   - The Button Module")
     print("  simon    - Simon Module")
     print("  memory   - Memory Module")
     print("  random   - Select a random module")
+    print("  bomb     - The standard bomb: wires, button, simon, memory")
+    print("  batch    - Play command scripts on seeded bombs, see 'batch --help'")
     print("\nIn-game commands:")
     print("  help     - Show this help")
     print("  manual   - Show the manual (for the expert)")
@@ -43,46 +46,75 @@ def print_help():
     print("  quit     - Exit the game")
 
 
-def get_module(module_name):
-    """Get the appropriate module based on the name."""
-    if module_name == "wires":
-        return RegularWiresModule()
-    elif module_name == "button":
-        return ButtonModule()
-    elif module_name == "simon":
-        return SimonSaysModule()
-    elif module_name == "memory":
-        return MemoryModule()
-    elif module_name == "random":
-        return random.choice([
-            RegularWiresModule(),
-            ButtonModule(),
-            SimonSaysModule(),
-            MemoryModule()
-        ])
-    else:
-        print(f"Unknown module: {module_name}")
+def get_bomb(tokens, seed=None):
+    """Build a bomb from the module names given on the command line."""
+    tokens = [token for name in tokens for token in (DEFAULT_SEQUENCE if name.lower() == "bomb" else [name])]
+    try:
+        return Bomb(seed, expand_sequence(tokens))
+    except ValueError as error:
+        print(error)
         print_help()
         sys.exit(1)
 
 
+def print_module_header(bomb):
+    """Print which module is current."""
+    print(f"\nModule {bomb.current_module + 1}/{bomb.module_count}: {bomb.module.module_id}")
+
+
+def print_state(bomb):
+    """Print the state and available actions of the current module."""
+    state, actions = bomb.state()
+    print(state)
+    if actions:
+        print("\nAvailable actions:")
+        for action in actions:
+            print(f"  {action}")
+
+
+def print_solve_times(solve_times, unsolved=None):
+    """Print how long every module took, and the module the game ended on, if any."""
+    if not solve_times and unsolved is None:
+        return
+    print("\nSolve times:")
+    for index, (module_id, seconds) in enumerate(solve_times, 1):
+        print(f"  {index:>3}. {module_id:<20} {seconds:7.1f}s")
+    if unsolved is not None:
+        module_id, seconds = unsolved
+        print(f"  {len(solve_times) + 1:>3}. {module_id:<20} {seconds:7.1f}s (not solved)")
+    total = sum(seconds for _, seconds in solve_times) + (unsolved[1] if unsolved else 0)
+    print(f"  Total: {total:.1f}s")
+
+
 def main():
     """Main function to run the game."""
-    if len(sys.argv) != 2 or sys.argv[1] in ["-h", "--help"]:
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch.main(sys.argv[2:])
+        return
+
+    if len(sys.argv) < 2 or sys.argv[1] in ["-h", "--help"]:
         print_help()
         sys.exit(0)
 
-    module_name = sys.argv[1].lower()
-    module = get_module(module_name)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("modules", nargs="+")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    bomb = get_bomb(args.modules, args.seed)
 
     print("Keep Talking and Nobody Explodes - Text Edition")
     print("\nType 'help' for commands, 'manual' for the expert, 'state' for the defuser.")
+    print_module_header(bomb)
+
+    solve_times = []
+    module_start = time.perf_counter()
 
     while True:
         command = input(f"\n{GREEN}> ").strip().lower()
         print(f"{GREEN}Selected command: {command}{RESET}")
 
         if command == "quit" or command == "exit":
+            print_solve_times(solve_times, (bomb.module.module_id, time.perf_counter() - module_start))
             print("Goodbye!")
             break
 
@@ -93,47 +125,49 @@ def main():
             print("=" * 50)
             print("=== MANUAL (FOR THE EXPERT) ===")
             print("=" * 50)
-            print(module.instruction())
+            print(bomb.module.instruction())
             print("=" * 50)
 
         elif command == "state":
             print("=" * 50)
             print("=== BOMB STATE (FOR THE DEFUSER) ===")
             print("=" * 50)
-            state, actions = module.state()
-            print(state)
-            if actions:
-                print("\nAvailable actions:")
-                for action in actions:
-                    print(f"  {action}")
+            print_state(bomb)
             print("=" * 50)
 
         elif command.startswith(("cut", "press", "hold", "release")):
-            result = module.do_action(command)
+            module_id = bomb.module.module_id
+            index = bomb.current_module
+            result = bomb.do_action(command)
+            seconds = time.perf_counter() - module_start
+
+            if bomb.current_module != index:
+                solve_times.append((module_id, seconds))
+                module_start = time.perf_counter()
+                print(f"Module {index + 1}/{bomb.module_count} ({module_id}) disarmed in {seconds:.1f}s.")
 
             if result == ActionResult.CHANGED:
-                print("The module state has changed.")
+                if bomb.current_module != index:
+                    print_module_header(bomb)
+                else:
+                    print("The module state has changed.")
                 # Show the updated state immediately after an action
-                state, actions = module.state()
                 print("\nCurrent state:")
-                print(state)
-                if actions:
-                    print("\nAvailable actions:")
-                    for action in actions:
-                        print(f"  {action}")
+                print_state(bomb)
 
             elif result == ActionResult.DISARMED:
-                # module.set_disarmed()
                 print("=" * 50)
-                print("MODULE SUCCESSFULLY DISARMED! CONGRATULATIONS!")
+                print("BOMB SUCCESSFULLY DISARMED! CONGRATULATIONS!")
                 print("=" * 50)
-                print("Type 'quit' to exit or start a new module.")
+                print_solve_times(solve_times)
+                break
 
             elif result == ActionResult.EXPLODED:
                 print("=" * 50)
                 print("BOOM! THE BOMB HAS EXPLODED. GAME OVER.")
                 print("=" * 50)
-                print("Type 'quit' to exit or start a new module.")
+                print_solve_times(solve_times, (module_id, seconds))
+                break
 
             elif result == ActionResult.INCORRECT:
                 print("That action is not valid or the module is already disarmed.")
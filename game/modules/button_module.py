@@ -3,21 +3,21 @@ from game.modules.module import Module, ActionResult
 
 
 class ButtonModule(Module):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, rng: random.Random | None = None):
+        super().__init__(rng)
         self.colors = ["red", "blue", "white", "yellow"]
         self.labels = ["Abort", "Detonate", "Hold", "Press"]
         
-        self.button_color = random.choice(self.colors)
-        self.button_label = random.choice(self.labels)
+        self.button_color = self.rng.choice(self.colors)
+        self.button_label = self.rng.choice(self.labels)
         
-        self.batteries = random.randint(0, 4)
+        self.batteries = self.rng.randint(0, 4)
         self.lit_indicators = []
         
         # Randomly decide if CAR and FRK indicators are present and lit
-        if random.choice([True, False]):
+        if self.rng.choice([True, False]):
             self.lit_indicators.append("CAR")
-        if random.choice([True, False]):
+        if self.rng.choice([True, False]):
             self.lit_indicators.append("FRK")
             
         self.is_holding = False
@@ -78,7 +78,7 @@ the defuser should press and immediately release the button, or hold it and rele
                     return ActionResult.EXPLODED
             elif action == "hold":
                 self.is_holding = True
-                self.strip_color = random.choice(["blue", "white", "yellow", "red", "green"])
+                self.strip_color = self.rng.choice(["blue", "white", "yellow", "red", "green"])
                 return ActionResult.CHANGED
             else:
                 return ActionResult.INCORRECT
@@ -3,8 +3,8 @@ from game.modules.module import Module, ActionResult
 
 
 class MemoryModule(Module):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, rng: random.Random | None = None):
+        super().__init__(rng)
         self.current_stage = 1
         self.max_stages = 5
         self.display_number = 0
@@ -14,9 +14,9 @@ class MemoryModule(Module):
     
     def generate_stage(self):
         """Generate a new stage with a display number and button labels."""
-        self.display_number = random.randint(1, 4)
+        self.display_number = self.rng.randint(1, 4)
         # Generate 4 unique button labels (1-4)
-        self.button_labels = random.sample(range(1, 5), 4)
+        self.button_labels = self.rng.sample(range(1, 5), 4)
     
     def instruction(self) -> str:
         """Return the instruction manual for this module."""
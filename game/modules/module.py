@@ -1,3 +1,5 @@
+import hashlib
+import random
 from enum import Enum
 
 
@@ -9,13 +11,31 @@ class ActionResult(Enum):
 
 
 class Module:
-    def __init__(self):
+    def __init__(self, rng: random.Random | None = None):
+        """
+        Args:
+            rng: Source of randomness of the module's layout and behavior. Defaults to the
+                global 'random' module; pass a seeded random.Random for a reproducible module.
+        """
         self.is_disarmed = False
+        self.rng = rng if rng is not None else random
     
     def set_disarmed(self):
         """Set the module as disarmed."""
         self.is_disarmed = True
     
+    @property
+    def module_id(self) -> str:
+        """Identifier of the module type, shared by all modules of the same class."""
+        return type(self).__name__
+
+    def manual_version(self) -> str:
+        """
+        Returns a short content hash of the manual.
+        It only changes when the text returned by instruction() changes.
+        """
+        return hashlib.sha256(self.instruction().encode()).hexdigest()[:12]
+
     def instruction(self) -> str:
         """
         Returns the instruction for the manual expert.
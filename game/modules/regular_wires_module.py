@@ -4,8 +4,8 @@ from game.modules.module import Module, ActionResult
 
 
 class RegularWiresModule(Module):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, rng: random.Random | None = None):
+        super().__init__(rng)
         self.wire_colors = []
         # Generate a serial number with letters and at least one digit
         self.serial_number = self._generate_serial_number()
@@ -14,18 +14,18 @@ class RegularWiresModule(Module):
     def _generate_serial_number(self) -> str:
         """Generate a random serial number with letters and at least one digit."""
         # Generate 5 random letters
-        letters = ''.join(random.choices(string.ascii_uppercase, k=5))
+        letters = ''.join(self.rng.choices(string.ascii_uppercase, k=5))
         # Generate at least one digit
-        digit = str(random.randint(0, 9))
+        digit = str(self.rng.randint(0, 9))
         # Insert the digit at a random position
-        position = random.randint(0, len(letters))
+        position = self.rng.randint(0, len(letters))
         return letters[:position] + digit + letters[position:]
     
     def generate_wires(self):
         """Generate a random set of wires for the module."""
         colors = ["red", "blue", "yellow", "white", "black"]
-        num_wires = random.randint(3, 6)
-        self.wire_colors = [random.choice(colors) for _ in range(num_wires)]
+        num_wires = self.rng.randint(3, 6)
+        self.wire_colors = [self.rng.choice(colors) for _ in range(num_wires)]
     
     def instruction(self) -> str:
         """Return the instruction manual for this module."""
@@ -4,8 +4,8 @@ from game.modules.module import Module, ActionResult
 
 
 class SimonSaysModule(Module):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, rng: random.Random | None = None):
+        super().__init__(rng)
         self.colors = ["red", "blue", "green", "yellow"]
         self.sequence = []
         self.current_round = 0
@@ -18,16 +18,16 @@ class SimonSaysModule(Module):
     def _generate_serial_number(self) -> str:
         """Generate a random serial number with letters and at least one digit."""
         # Generate 5 random letters
-        letters = ''.join(random.choices(string.ascii_uppercase, k=5))
+        letters = ''.join(self.rng.choices(string.ascii_uppercase, k=5))
         # Generate at least one digit
-        digit = str(random.randint(0, 9))
+        digit = str(self.rng.randint(0, 9))
         # Insert the digit at a random position
-        position = random.randint(0, len(letters))
+        position = self.rng.randint(0, len(letters))
         return letters[:position] + digit + letters[position:]
 
     def generate_sequence(self):
         """Generate a random sequence of colors."""
-        self.sequence = [random.choice(self.colors) for _ in range(self.max_rounds)]
+        self.sequence = [self.rng.choice(self.colors) for _ in range(self.max_rounds)]
 
     def get_color_mapping(self, color: str, index: int) -> str:
         """Get the mapped color based on the serial number and current round."""
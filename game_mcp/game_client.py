@@ -2,45 +2,99 @@ import asyncio
 import argparse
 import json
 import ast
+import random
+import re
 import urllib.parse
+import uuid
 
 import aiohttp
 from aiohttp_sse_client import client as sse_client
 
+from game_mcp import profiling
+from game_mcp.protocol import BOMB_STATE_HEADER, CHANGED_STATE_MARKER
 
 # Feel free to import any libraries you need - if needed change requirements.txt
 
 
+# Module line the server adds to every state, e.g. "Module 1/4: RegularWiresModule [manual 3f2a9c01d4e5]"
+MODULE_HEADER = re.compile(r"^Module (\d+)/(\d+): (\w+) \[manual (\w+)\]$", re.MULTILINE)
+MANUAL_VERSION_PREFIX = "Manual version: "
+MANUAL_NOT_MODIFIED = "=== MANUAL NOT MODIFIED ==="
+
+# Errors that mean the stream or session is gone and the call may be retried on a new one
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)
+
+
 class BombClient:
-    def __init__(self):
+    def __init__(
+            self,
+            resume_token: str | None = None,
+            seed: int | None = None,
+            connect_timeout: float = 10.0,
+            read_timeout: float = 30.0,
+            max_retries: int = 5,
+            backoff_base: float = 0.5,
+            backoff_max: float = 10.0,
+    ):
+        """
+        :param resume_token: Token that binds this client to a bomb on the server. Clients sharing a
+               token play the same bomb, and a reconnecting client picks its game back up.
+               Without a token the server's default bomb is used.
+        :param seed: Seed the server creates the resume token's bomb from, for a reproducible game.
+        :param connect_timeout: Seconds to wait for the SSE stream and POST connections to open.
+        :param read_timeout: Seconds to wait for a single SSE event before the stream is considered dead.
+        :param max_retries: How many times a dropped handshake or tool call is retried.
+        :param backoff_base: Base delay in seconds of the exponential reconnect backoff.
+        :param backoff_max: Upper bound in seconds of a single backoff delay.
+        """
         # YOUR CODE STARTS HERE
         self.session: aiohttp.ClientSession | None = None
         self.event_source: sse_client.EventSource | None = None
+        self.server_url: str | None = None
         self.session_url: str | None = None
+        self.resume_token = resume_token
+        self.seed = seed
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
         self._id_counter = 1
         # YOUR CODE ENDS HERE
 
     async def connect_to_server(self, server_url: str):
         """Connect to an sse MCP server"""
         # YOUR CODE STARTS HERE
-        base = server_url.rstrip("/")
-        self.session = aiohttp.ClientSession()
-        self.event_source = sse_client.EventSource(f"{base}/")
-        await self.event_source.connect()
+        self.server_url = server_url.rstrip("/")
+        await self._with_retries(self._open_session)
+        # YOUR CODE ENDS HERE
+
+    async def _open_session(self):
+        """Open the SSE stream and run the MCP initialize handshake"""
+        base = self.server_url
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout)
+            )
+        self.event_source = sse_client.EventSource(
+            f"{base}/",
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout),
+        )
+        await asyncio.wait_for(self.event_source.connect(), self.connect_timeout)
 
         # Step 1: read until we get the session_id URL
-        async for event in self.event_source:
-            raw = event.data.strip().strip("'\"")
+        while True:
+            raw = (await self._next_message()).strip("'\"")
             if "/session_id/" in raw and "session_id=" in raw:
                 parsed = urllib.parse.urlparse(raw)
                 qs = urllib.parse.parse_qs(parsed.query)
                 sid = qs.get("session_id", [None])[0]
                 if sid:
-                    self.session_url = f"{base}{parsed.path}?session_id={sid}"
+                    session_url = f"{base}{parsed.path}?session_id={sid}"
                     break
 
         # Step 2: send initialize handshake (with clientInfo.version!)
-        init_id = self._id_counter
+        init_id = self._next_id()
         init_payload = {
             "jsonrpc": "2.0",
             "id": init_id,
@@ -54,137 +108,220 @@ class BombClient:
                 "capabilities": {}
             },
         }
-        self._id_counter += 1
-
-        await self.session.post(self.session_url, json=init_payload)
+        await self._post(session_url, init_payload)
 
         # Step 3: await initialize response and send notification
-        async for event in self.event_source:
-            raw = event.data.strip()
-            # skip session_id lines
-            if raw.startswith("/") or raw.startswith("'/"):
-                continue
-            try:
-                msg = json.loads(raw)
-            except json.JSONDecodeError:
-                continue
-
-            if msg.get("id") == init_id:
-                # once we see the initialize response, send the 'initialized' notification:
-                notification = {
-                    "jsonrpc": "2.0",
-                    "method": "notifications/initialized"
-                }
-                await self.session.post(self.session_url, json=notification)
-                return
-        # YOUR CODE ENDS HERE
+        await self._await_response(init_id)
+        notification = {
+            "jsonrpc": "2.0",
+            "method": "notifications/initialized"
+        }
+        await self._post(session_url, notification)
+        self.session_url = session_url
 
     async def process_query(self, tool_name: str, tool_args: dict[str, str]) -> str:
         """Process a query using the game_interaction or get_manual tool"""
         # YOUR CODE STARTS HERE
-        if not (self.session and self.event_source and self.session_url):
+        if not self.server_url:
             raise RuntimeError("Not connected to server")
 
+        # The request id stays the same across retries, so the server answers a replayed
+        # call from its response cache instead of applying the action a second time.
+        arguments = dict(tool_args, request_id=uuid.uuid4().hex)
+        if self.resume_token:
+            arguments["resume_token"] = self.resume_token
+            if self.seed is not None:
+                arguments["seed"] = self.seed
+
+        async def call() -> str:
+            if self.session_url is None:
+                await self._open_session()
+
+            req_id = self._next_id()
+            payload = {
+                "jsonrpc": "2.0",
+                "id": req_id,
+                "method": "tools/call",
+                "params": {
+                    "name": tool_name,
+                    "arguments": arguments,
+                },
+            }
+            await self._post(self.session_url, payload)
+
+            result = (await self._await_response(req_id)).get("result")
+            # server returns a list of strings for tool calls
+            if isinstance(result, list) and result:
+                return result[0]
+            return str(result)
+
+        with profiling.span("sse.round_trip", tool=tool_name):
+            return await self._with_retries(call)
+        # YOUR CODE ENDS HERE
+
+    async def _with_retries(self, operation):
+        """Run 'operation', reconnecting with jittered exponential backoff when the connection drops"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await operation()
+            except RETRYABLE_ERRORS as exc:
+                await self._close_stream()
+                if attempt == self.max_retries:
+                    raise ConnectionError(
+                        f"Lost connection to {self.server_url} after {attempt + 1} attempts"
+                    ) from exc
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+
+    def _next_id(self) -> int:
         req_id = self._id_counter
-        payload = {
-            "jsonrpc": "2.0",
-            "id": req_id,
-            "method": "tools/call",
-            "params": {
-                "name": tool_name,
-                "arguments": tool_args,
-            },
-        }
         self._id_counter += 1
+        return req_id
 
-        await self.session.post(self.session_url, json=payload)
+    async def _post(self, url: str, payload: dict):
+        async with self.session.post(url, json=payload) as resp:
+            resp.raise_for_status()
 
-        async for event in self.event_source:
-            raw = event.data.strip()
-            # skip any stray session_id messages
+    async def _next_message(self) -> str:
+        """Read the data of the next SSE event, waiting at most 'read_timeout' seconds"""
+        try:
+            event = await asyncio.wait_for(self.event_source.__anext__(), self.read_timeout)
+        except StopAsyncIteration:
+            raise ConnectionResetError("SSE stream closed by server") from None
+        return event.data.strip()
+
+    async def _await_response(self, req_id: int) -> dict:
+        """Read SSE events until the JSON-RPC response with id 'req_id' arrives"""
+        while True:
+            raw = await self._next_message()
+            # A new session_id announcement means the stream was silently re-established,
+            # and the response to our request will never arrive on it.
             if raw.startswith("/") or raw.startswith("'/"):
-                continue
+                raise ConnectionResetError("SSE stream was reset while awaiting a response")
             try:
                 msg = json.loads(raw)
             except json.JSONDecodeError:
                 continue
 
             # handle only our response
-            if msg.get("id") != req_id:
-                continue
-
-            result = msg.get("result")
-            # server returns a list of strings for tool calls
-            if isinstance(result, list) and result:
-                return result[0]
-            return str(result)
-        # YOUR CODE ENDS HERE
+            if isinstance(msg, dict) and msg.get("id") == req_id:
+                return msg
 
-    async def cleanup(self):
-        """Properly clean up the session and streams"""
-        # YOUR CODE STARTS HERE
+    async def _close_stream(self):
+        """Drop the current SSE stream so the next call opens a fresh session"""
+        self.session_url = None
         if self.event_source:
             try:
                 await self.event_source.close()
             except Exception:
                 pass
+            self.event_source = None
         if self.session:
             await self.session.close()
+            self.session = None
+
+    async def cleanup(self):
+        """Properly clean up the session and streams"""
+        # YOUR CODE STARTS HERE
+        await self._close_stream()
         # YOUR CODE ENDS HERE
 
 
 class Defuser(BombClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Identity of the current module, as last reported with the bomb state
+        self.module_index: int | None = None
+        self.module_count: int | None = None
+        self.module_id: str | None = None
+        self.manual_version: str | None = None
+        # The bomb state as of the last response, if that response carried it; None when it must be fetched
+        self.latest_state: str | None = None
+
     async def run(self, action: str) -> str:
         """Run a defuser action"""
         # YOUR CODE STARTS HERE
-        resp = await self.process_query("game_interaction", {"command": action})
-
-        try:
-            data = json.loads(resp)
-            if isinstance(data, dict) and 'content' in data:
-                resp = data['content'][0]['text']
-        except json.JSONDecodeError:
-            try:
-                data = ast.literal_eval(resp)
-                if isinstance(data, dict) and 'content' in data:
-                    resp = data['content'][0]['text']
-            except Exception:
-                pass
+        resp = unwrap_text(await self.process_query("game_interaction", {"command": action}))
+        self._track_module(resp)
+        self._track_state(action, resp)
 
         if "BOOM!" in resp:
             return "BOOM!"
         if "DISARMED" in resp:
             return "BOMB SUCCESSFULLY DISARMED!"
-        if action.lower() == "state":
-            return resp.splitlines()[0].strip("= ").upper()
         return resp
         # YOUR CODE ENDS HERE
 
+    def _track_state(self, action: str, resp: str):
+        """Keep the state a response reports, so it need not be asked for again"""
+        if action == "state" and resp.startswith(BOMB_STATE_HEADER):
+            self.latest_state = resp
+        elif resp.startswith(CHANGED_STATE_MARKER):
+            self.latest_state = BOMB_STATE_HEADER + resp.removeprefix(CHANGED_STATE_MARKER)
+        elif action != "help":
+            # Any other action may have changed the bomb without describing it
+            self.latest_state = None
+
+    def _track_module(self, resp: str):
+        """Remember the module id and manual version the server reports with the state"""
+        match = MODULE_HEADER.search(resp)
+        if match:
+            self.module_index = int(match.group(1)) - 1
+            self.module_count = int(match.group(2))
+            self.module_id = match.group(3)
+            self.manual_version = match.group(4)
+
 
 class Expert(BombClient):
-    async def run(self) -> str:
-        """Run an expert action"""
+    # Manual texts by content version, shared by every Expert in the process
+    manual_cache: dict[str, str] = {}
+
+    async def run(self, manual_version: str | None = None) -> str:
+        """Run an expert action
+
+        :param manual_version: Version of the current module's manual, as reported with the bomb state.
+               If that manual is already cached it is returned without contacting the server.
+        """
         # YOUR CODE STARTS HERE
-        resp = await self.process_query("get_manual", {})
+        if manual_version in self.manual_cache:
+            return self.manual_cache[manual_version]
 
-        try:
-            data = json.loads(resp)
-            if isinstance(data, dict) and 'content' in data:
-                return data['content'][0]['text']
-        except json.JSONDecodeError:
-            try:
-                data = ast.literal_eval(resp)
-                if isinstance(data, dict) and 'content' in data:
-                    return data['content'][0]['text']
-            except Exception:
-                pass
+        # Let the server skip the manual body if it is one we already hold
+        resp = unwrap_text(await self.process_query(
+            "get_manual", {"if_none_match": ",".join(self.manual_cache)}
+        ))
 
         if "BOOM!" in resp:
             return "BOOM!"
         if "DISARMED" in resp:
             return "BOMB SUCCESSFULLY DISARMED!"
-        return resp.splitlines()[0]
 
+        header, _, body = resp.partition("\n")
+        if header == MANUAL_NOT_MODIFIED:
+            header, _, body = body.partition("\n")
+            return self.manual_cache[header.removeprefix(MANUAL_VERSION_PREFIX)]
+        if header.startswith(MANUAL_VERSION_PREFIX):
+            body = body.lstrip("\n")
+            self.manual_cache[header.removeprefix(MANUAL_VERSION_PREFIX)] = body
+            return body
+        return resp
+        # YOUR CODE ENDS HERE
+
+
+def unwrap_text(resp: str) -> str:
+    """Extract the text content from a tool call result, which may arrive JSON- or repr-encoded"""
+    try:
+        data = json.loads(resp)
+        if isinstance(data, dict) and 'content' in data:
+            return data['content'][0]['text']
+    except json.JSONDecodeError:
+        try:
+            data = ast.literal_eval(resp)
+            if isinstance(data, dict) and 'content' in data:
+                return data['content'][0]['text']
+        except Exception:
+            pass
+    return resp
 
 
 async def main():
@@ -193,10 +330,12 @@ async def main():
     parser = argparse.ArgumentParser(description="Run MCP game client")
     parser.add_argument("--url", required=True, help="Server URL, e.g. http://localhost:8080")
     parser.add_argument("--role", required=True, choices=["Defuser", "Expert"])
+    parser.add_argument("--resume-token", default=None,
+                        help="Play (or rejoin) the bomb bound to this token instead of the server's default bomb")
     args = parser.parse_args()
 
     if args.role == "Defuser":
-        client = Defuser()
+        client = Defuser(resume_token=args.resume_token)
         await client.connect_to_server(args.url)
         try:
             while True:
@@ -208,7 +347,7 @@ async def main():
         finally:
             await client.cleanup()
     else:
-        client = Expert()
+        client = Expert(resume_token=args.resume_token)
         await client.connect_to_server(args.url)
         try:
             while True:
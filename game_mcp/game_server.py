@@ -1,4 +1,5 @@
 import argparse
+from collections import OrderedDict
 
 import uvicorn
 from mcp.server.fastmcp import FastMCP
@@ -9,87 +10,124 @@ from starlette.requests import Request
 from starlette.routing import Mount, Route
 
 from game.bomb import Bomb
-from game.modules.module import ActionResult
+from game_mcp.protocol import SESSION_EXPIRED, handle_command, manual_text
 
 # Initialize FastMCP server
 mcp = FastMCP("Game")
 bomb = Bomb()
 
-BOMB_EXPLODED = f"=== BOOM! THE BOMB HAS EXPLODED. GAME OVER. === \n\n'"
-BOMB_DISARMED = f"=== BOMB SUCCESSFULLY DISARMED! CONGRATULATIONS! ===\n\n"
-UNKNOWN_COMMAND = "Unknown command. Type 'help' for available commands.\n\n"
-HELP_TEXT = """Keep Talking and Nobody Explodes
+# Bombs bound to a client-supplied resume token, so a reconnecting client gets its game back.
+# Beyond MAX_BOMBS games in play, the least recently played one is dropped.
+MAX_BOMBS = 1024
+bombs: OrderedDict[str, Bomb] = OrderedDict()
+# Bombs whose game has ended, so that late calls of the game see its end instead of a new bomb
+MAX_FINISHED_BOMBS = 1024
+finished_bombs: OrderedDict[str, Bomb] = OrderedDict()
+# Tokens whose bomb was dropped from either store, so that their late calls get an error instead of a new bomb
+MAX_EXPIRED_TOKENS = 65536
+expired_tokens: OrderedDict[str, None] = OrderedDict()
 
-Game Description:
-In this game, there are two players:
-• The Defuser (you): Sees the bomb's current module 'screen' but not the manual.
-• The Manual Expert: Has access to the defusal manual but not the bomb's display.
-Players must collaborate by exchanging text instructions to solve each module.
-The goal is to disarm all modules before time runs out or the bomb explodes.
-Each module has specific rules that must be followed precisely.
-Communication is key - the defuser must clearly describe what they see,
-and the expert must provide clear instructions based on the manual.
+# Responses of recent tool calls by request id, so a replayed call is not applied twice
+MAX_REMEMBERED_RESPONSES = 1024
+responses: OrderedDict[str, str] = OrderedDict()
 
-"""
+
+def expire(resume_token: str) -> None:
+    """Remember that the bomb of 'resume_token' has been dropped."""
+    expired_tokens[resume_token] = None
+    if len(expired_tokens) > MAX_EXPIRED_TOKENS:
+        expired_tokens.popitem(last=False)
+
+
+def get_bomb(resume_token: str = "", seed: int | None = None) -> Bomb | None:
+    """
+    Return the bomb bound to 'resume_token', creating it on first use from 'seed'.
+
+    None if the token's bomb has been dropped to make room for newer games; a new bomb
+    would silently restart the game under the client's feet.
+    """
+    if not resume_token:
+        return bomb
+    if resume_token in finished_bombs:
+        return finished_bombs[resume_token]
+    if resume_token in expired_tokens:
+        return None
+    if resume_token in bombs:
+        bombs.move_to_end(resume_token)
+    else:
+        bombs[resume_token] = Bomb(seed)
+        if len(bombs) > MAX_BOMBS:
+            expire(bombs.popitem(last=False)[0])
+    return bombs[resume_token]
+
+
+def run_command(resume_token: str, seed: int | None, command: str) -> str:
+    """Execute a command on the bomb of 'resume_token' and retire the bomb once its game has ended."""
+    game = get_bomb(resume_token, seed)
+    if game is None:
+        return SESSION_EXPIRED
+    res = handle_command(game, command)
+    if resume_token in bombs and (game.disarmed or game.exploded):
+        finished_bombs[resume_token] = bombs.pop(resume_token)
+        if len(finished_bombs) > MAX_FINISHED_BOMBS:
+            expire(finished_bombs.popitem(last=False)[0])
+    return res
+
+
+def read_manual(resume_token: str, seed: int | None, if_none_match: str) -> str:
+    """The manual of the current module of the bomb of 'resume_token'."""
+    game = get_bomb(resume_token, seed)
+    if game is None:
+        return SESSION_EXPIRED
+    return manual_text(game, if_none_match)
+
+
+def replay_or_run(resume_token: str, request_id: str, handler) -> str:
+    """Run 'handler' once per request id and answer repeated requests from the response cache."""
+    if not request_id:
+        return handler()
+
+    key = f"{resume_token}:{request_id}"
+    if key in responses:
+        responses.move_to_end(key)
+        return responses[key]
+
+    res = handler()
+    responses[key] = res
+    if len(responses) > MAX_REMEMBERED_RESPONSES:
+        responses.popitem(last=False)
+    return res
 
 
 @mcp.tool()
-async def game_interaction(command: str) -> str:
+async def game_interaction(
+    command: str, resume_token: str = "", request_id: str = "", seed: int | None = None
+) -> str:
     """Get the current status of the game.
 
     Args:
         command: str: The command to execute.
+        resume_token: str: Token of the bomb to play, empty for the default bomb.
+        request_id: str: Unique id of this call; a retried call with the same id is not executed again.
+        seed: int | None: Seed of the bomb, used when the resume token's bomb is created.
     """
     print(f"Received command: {command}")
-    if command == "help":
-        return HELP_TEXT
-
-    elif command == "state":
-        res = f"=== BOMB STATE ===\n\n"
-
-        state, actions = bomb.state()
-        res += state + "\n"
-        if actions:
-            res += "\nAvailable commands:" + "\n"
-            for action in actions:
-                res += f"  {action}" + "\n"
-        res += "\n"
-
-        return res
-
-    elif command.startswith(("cut", "press", "hold", "release")):
-        result = bomb.do_action(command)
-
-        if result == ActionResult.CHANGED:
-            res = "The module state has changed." + "\n"
-            state, actions = bomb.state()
-            res += "\nCurrent state:" + "\n"
-            res += state
-            if actions:
-                res += "\nAvailable commands:" + "\n"
-                for action in actions:
-                    res += f"  {action}" + "\n"
-            res += "\n"
-
-            return res
-
-        elif result == ActionResult.DISARMED:
-            return BOMB_DISARMED
-        elif result == ActionResult.EXPLODED:
-            return BOMB_EXPLODED
-
-    return UNKNOWN_COMMAND
+    return replay_or_run(resume_token, request_id, lambda: run_command(resume_token, seed, command))
 
 
 @mcp.tool()
-async def get_manual() -> str:
-    """Get the manual for the game."""
-    if bomb.exploded:
-        return BOMB_EXPLODED
-    if bomb.disarmed:
-        return BOMB_DISARMED
-
-    return bomb.modules[bomb.current_module].instruction()
+async def get_manual(
+    resume_token: str = "", request_id: str = "", if_none_match: str = "", seed: int | None = None
+) -> str:
+    """Get the manual for the game.
+
+    Args:
+        if_none_match: str: Comma-separated manual versions the caller already holds.
+        resume_token: str: Token of the bomb to read the manual for, empty for the default bomb.
+        request_id: str: Unique id of this call; a retried call with the same id is not executed again.
+        seed: int | None: Seed of the bomb, used when the resume token's bomb is created.
+    """
+    return replay_or_run(resume_token, request_id, lambda: read_manual(resume_token, seed, if_none_match))
 
 
 def create_starlette_app(mcp_server: Server, *, debug: bool = False) -> Starlette:
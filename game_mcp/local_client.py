@@ -0,0 +1,55 @@
+from game.bomb import Bomb
+from game_mcp.game_client import Defuser, Expert
+from game_mcp.protocol import handle_command, manual_text
+
+
+class LocalGame:
+    """In-process stand-in for the game server: bombs by resume token and the two tools."""
+
+    def __init__(self):
+        self.bombs: dict[str, Bomb] = {}
+
+    def get_bomb(self, resume_token: str, seed: int | None = None) -> Bomb:
+        """Return the bomb bound to 'resume_token', creating it on first use from 'seed'."""
+        if resume_token not in self.bombs:
+            self.bombs[resume_token] = Bomb(seed)
+        return self.bombs[resume_token]
+
+    def call(self, tool_name: str, arguments: dict) -> str:
+        """Answer a tool call exactly like the server does."""
+        bomb = self.get_bomb(arguments.get("resume_token", ""), arguments.get("seed"))
+        if tool_name == "game_interaction":
+            return handle_command(bomb, arguments["command"])
+        if tool_name == "get_manual":
+            return manual_text(bomb, arguments.get("if_none_match", ""))
+        raise ValueError(f"Unknown tool {tool_name!r}")
+
+
+class LocalClient:
+    """Plays against a LocalGame instead of an MCP server, without any network round trip."""
+
+    def __init__(self, game: LocalGame, *args, **kwargs):
+        """
+        :param game: The in-process game, shared by the Defuser and Expert of a bomb.
+        :param args: Arguments of BombClient, e.g. the resume token and seed.
+        """
+        super().__init__(*args, **kwargs)
+        self.game = game
+
+    async def connect_to_server(self, server_url: str = "local"):
+        self.server_url = server_url
+
+    async def process_query(self, tool_name: str, tool_args: dict[str, str]) -> str:
+        arguments = dict(tool_args, resume_token=self.resume_token or "", seed=self.seed)
+        return self.game.call(tool_name, arguments)
+
+    async def cleanup(self):
+        pass
+
+
+class LocalDefuser(LocalClient, Defuser):
+    pass
+
+
+class LocalExpert(LocalClient, Expert):
+    pass
@@ -0,0 +1,133 @@
+"""
+Opt-in span instrumentation of game turns.
+
+Profiling is off unless the BOMB_PROFILE environment variable is set (to the trace
+file 'python -m agents.two_agents' writes) or 'enable()' is called. While it is off,
+'span()' returns a shared no-op context manager, so instrumented code pays one
+function call and a flag check per span.
+
+    with profiling.collect() as phases:
+        with profiling.span("turn.expert_generate", module="MemoryModule"):
+            ...
+    phases  # {"turn.expert_generate": {"count": 1, "seconds": 0.42}}
+    profiling.export_chrome_trace("trace.json")  # open in chrome://tracing or ui.perfetto.dev
+
+Spans are recorded as Chrome trace events. Each span is also added to the phase
+totals of the innermost 'collect()' block of the current context, i.e. of the game
+being played. Work submitted to the inference executor keeps that context.
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+PhaseTotals = Dict[str, Dict[str, float]]
+
+_enabled = bool(os.environ.get("BOMB_PROFILE"))
+_events: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+_phases: contextvars.ContextVar[Optional[PhaseTotals]] = contextvars.ContextVar("phases", default=None)
+_NO_SPAN = contextlib.nullcontext()
+
+
+def enable() -> None:
+    """Start recording spans."""
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """Stop recording spans. Recorded events are kept until 'reset()'."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **args: Any) -> contextlib.AbstractContextManager:
+    """
+    Time the enclosed block as one span.
+
+    :param name: Phase name, e.g. 'sse.round_trip' or 'model.decode'.
+    :param args: Details shown with the event in the trace viewer.
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _span(name, args)
+
+
+@contextlib.contextmanager
+def _span(name: str, args: Dict[str, Any]) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter(), **args)
+
+
+def record(name: str, start: float, end: float, **args: Any) -> None:
+    """
+    Record a span measured by the caller, e.g. from timestamps taken inside model.generate().
+
+    :param name: Phase name.
+    :param start: time.perf_counter() at the start of the span.
+    :param end: time.perf_counter() at its end.
+    :param args: Details shown with the event in the trace viewer.
+    """
+    if not _enabled:
+        return
+    event = {
+        "name": name,
+        "cat": name.split(".", 1)[0],
+        "ph": "X",
+        "ts": start * 1e6,
+        "dur": (end - start) * 1e6,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args,
+    }
+    with _lock:
+        _events.append(event)
+        phases = _phases.get()
+        if phases is not None:
+            totals = phases.setdefault(name, {"count": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["seconds"] += end - start
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[PhaseTotals]:
+    """
+    Aggregate the spans recorded in this context, per phase name, into the yielded dict.
+
+    Stays empty while profiling is disabled.
+    """
+    phases: PhaseTotals = {}
+    token = _phases.set(phases)
+    try:
+        yield phases
+    finally:
+        _phases.reset(token)
+
+
+def events() -> List[Dict[str, Any]]:
+    """A copy of all recorded trace events."""
+    with _lock:
+        return list(_events)
+
+
+def reset() -> None:
+    """Drop all recorded events."""
+    with _lock:
+        _events.clear()
+
+
+def export_chrome_trace(path: str) -> None:
+    """Write the recorded events in the Chrome trace-event format."""
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events(), "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,100 @@
+"""
+Text protocol of the game tools: the responses the server sends for a bomb.
+
+Pure functions of a Bomb, shared by the MCP server and by in-process clients that
+play without a server, e.g. to replay recorded games.
+"""
+from game.bomb import Bomb
+from game.modules.module import ActionResult
+
+BOMB_EXPLODED = f"=== BOOM! THE BOMB HAS EXPLODED. GAME OVER. === \n\n'"
+BOMB_DISARMED = f"=== BOMB SUCCESSFULLY DISARMED! CONGRATULATIONS! ===\n\n"
+MANUAL_VERSION_PREFIX = "Manual version: "
+MANUAL_NOT_MODIFIED = "=== MANUAL NOT MODIFIED ==="
+BOMB_STATE_HEADER = "=== BOMB STATE ===\n\n"
+# An action response that carries the bomb's new state after this marker
+CHANGED_STATE_MARKER = "The module state has changed.\n\nCurrent state:\n"
+# Answer to a resume token whose bomb the server has dropped to make room for newer games
+SESSION_EXPIRED = "=== UNKNOWN OR EXPIRED SESSION ===\n\nStart a new game with a new resume token.\n"
+UNKNOWN_COMMAND = "Unknown command. Type 'help' for available commands.\n\n"
+HELP_TEXT = """Keep Talking and Nobody Explodes
+
+Game Description:
+In this game, there are two players:
+• The Defuser (you): Sees the bomb's current module 'screen' but not the manual.
+• The Manual Expert: Has access to the defusal manual but not the bomb's display.
+Players must collaborate by exchanging text instructions to solve each module.
+The goal is to disarm all modules before time runs out or the bomb explodes.
+Each module has specific rules that must be followed precisely.
+Communication is key - the defuser must clearly describe what they see,
+and the expert must provide clear instructions based on the manual.
+
+"""
+
+
+def module_header(bomb: Bomb) -> str:
+    """Describe which module is current and which manual version belongs to it."""
+    if bomb.exploded or bomb.disarmed:
+        return ""
+    module = bomb.module
+    return (f"Module {bomb.current_module + 1}/{bomb.module_count}: "
+            f"{module.module_id} [manual {module.manual_version()}]\n")
+
+
+def state_text(bomb: Bomb) -> str:
+    """
+    The current module's header, state and available commands.
+
+    Both the 'state' command and an action that changes the module report the state
+    with this text, so a client can reuse the state an action returned in place of
+    asking for it.
+    """
+    state, actions = bomb.state()
+    res = module_header(bomb)
+    res += state + "\n"
+    if actions:
+        res += "\nAvailable commands:" + "\n"
+        for action in actions:
+            res += f"  {action}" + "\n"
+    res += "\n"
+    return res
+
+
+def handle_command(bomb: Bomb, command: str) -> str:
+    """Execute a player command on 'bomb' and return the response text."""
+    if command == "help":
+        return HELP_TEXT
+
+    elif command == "state":
+        return BOMB_STATE_HEADER + state_text(bomb)
+
+    elif command.startswith(("cut", "press", "hold", "release")):
+        result = bomb.do_action(command)
+
+        if result == ActionResult.CHANGED:
+            return CHANGED_STATE_MARKER + state_text(bomb)
+
+        elif result == ActionResult.DISARMED:
+            return BOMB_DISARMED
+        elif result == ActionResult.EXPLODED:
+            return BOMB_EXPLODED
+
+    return UNKNOWN_COMMAND
+
+
+def manual_text(bomb: Bomb, if_none_match: str = "") -> str:
+    """Return the versioned manual of the current module of 'bomb'.
+
+    Only a short not-modified notice is returned when the version is among
+    the comma-separated versions in 'if_none_match'.
+    """
+    if bomb.exploded:
+        return BOMB_EXPLODED
+    if bomb.disarmed:
+        return BOMB_DISARMED
+
+    module = bomb.module
+    version = module.manual_version()
+    if version in if_none_match.split(","):
+        return f"{MANUAL_NOT_MODIFIED}\n{MANUAL_VERSION_PREFIX}{version}\n"
+    return f"{MANUAL_VERSION_PREFIX}{version}\n\n{module.instruction()}"
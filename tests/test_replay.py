@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from agents import two_agents
+from agents.oracle import OracleDefuser, OracleExpert
+from agents.replay import replay_game
+from agents.trace import GameTrace
+
+
+class CharTokenizer:
+    """Counts every character as a token, about four times the approximate count."""
+
+    def encode(self, text, add_special_tokens=True):
+        return list(text)
+
+
+def test_replay_compacts_memory_like_the_recording(monkeypatch):
+    expert = OracleExpert()
+    expert.tokenizer = CharTokenizer()
+    recorded = GameTrace(seed=0)
+    result = asyncio.run(two_agents.run_two_agents(
+        OracleDefuser(), expert, seed=0, local=True, memory_tokens=64, trace=recorded, verbose=False
+    ))
+    assert result.disarmed
+    assert recorded.settings["memory_tokenizer"] == "oracle"
+
+    # Approximate counts compact the memory differently once it outgrows its budget
+    monkeypatch.setattr(two_agents, "load_tokenizer", lambda checkpoint: None)
+    assert asyncio.run(replay_game(0, recorded))
+
+    monkeypatch.setattr(two_agents, "load_tokenizer", lambda checkpoint: CharTokenizer())
+    assert asyncio.run(replay_game(0, recorded)) == []